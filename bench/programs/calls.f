@@ -0,0 +1,17 @@
+: w0 1 + ;
+: w1 w0 w0 ;
+: w2 w1 w1 ;
+: w3 w2 w2 ;
+: w4 w3 w3 ;
+: w5 w4 w4 ;
+: w6 w5 w5 ;
+: w7 w6 w6 ;
+: w8 w7 w7 ;
+: w9 w8 w8 ;
+: w10 w9 w9 ;
+: w11 w10 w10 ;
+: w12 w11 w11 ;
+: w13 w12 w12 ;
+: w14 w13 w13 ;
+: w15 w14 w14 ;
+0 w15 .
@@ -0,0 +1,2 @@
+: fib? dup 2 < invert if dup 1 - fib? swap 2 - fib? + then ;
+22 fib? .
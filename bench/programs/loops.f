@@ -0,0 +1,4 @@
+: inner 40 0 do i j k + + + loop ;
+: middle 40 0 do inner loop ;
+: outer 40 0 do middle loop ;
+0 outer .
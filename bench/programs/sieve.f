@@ -0,0 +1,3 @@
+: divisors do j i mod 0 = + loop ;
+: primes 800 2 do 0 i 2 divisors 0 = + loop ;
+0 primes .
@@ -0,0 +1,3 @@
+: line "the quick brown fox " puts "jumps over the lazy dog" puts cr puts ;
+: lines 3000 0 do line loop ;
+lines
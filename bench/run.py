@@ -0,0 +1,259 @@
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Optional
+
+# runs the programs in bench/programs and a generated large source through the front end,
+# both sim engines and com, reports the numbers and writes them as json to compare commits
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAIN = os.path.join(ROOT, 'main.py')
+PROGRAMS = os.path.join(ROOT, 'bench', 'programs')
+RESULTS = os.path.join(ROOT, 'bench', 'results')
+
+sys.path.insert(0, ROOT)
+from main import parse, simulate_program  # noqa: E402
+from src import nodes  # noqa: E402
+from src.prog import Program  # noqa: E402
+from src.stack import ArrayStack  # noqa: E402
+from src.trace import Tracer  # noqa: E402
+
+ENGINES = ['vm', 'tree']
+STACK_SIZE = 1 << 16
+# programs whose binary prints differently from sim by design, their output is not compared.
+# puts ends the line in sim but writes only the string in compiled programs
+OUTPUT_DIFFERS = {'strings'}
+
+
+def generate(path: str, words: int):
+    '''writes a large source of many small words and the statements that call them'''
+    with open(path, 'w') as f:
+        for n in range(words):
+            f.write(f': g{n} {n % 10} + dup * 1000 mod ;\n')
+            f.write(f'{n} g{n} g{n // 2} .\n')
+
+
+def median_time(function, runs: int) -> float:
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+# --- front end and sim ---
+
+def parse_file(path: str, opt: int):
+    '''statements, dictionary and string pool of path, parsed completely'''
+    options = argparse.Namespace(opt=opt)
+    with open(path, 'r') as f:
+        statements, words, strings = parse(path, f, options, Tracer())
+        return list(statements), words, strings
+
+
+def simulate(path: str, opt: int, engine: str) -> tuple:
+    '''seconds the engine needs for the parsed program and what it printed'''
+    statements, words, strings = parse_file(path, opt)
+    prog = Program([], words, ArrayStack(STACK_SIZE), strings)
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        start = time.perf_counter()
+        simulate_program(prog, statements, engine)
+        seconds = time.perf_counter() - start
+    return seconds, out.getvalue()
+
+
+def count_nodes(path: str, opt: int) -> int:
+    '''number of nodes the tree engine simulates, the unit of the ops per second of both engines'''
+    count = [0]
+
+    def counted(simulate):
+        def wrapper(node, prog):
+            count[0] += 1
+            return simulate(node, prog)
+        return wrapper
+
+    classes = [c for c in vars(nodes).values() if isinstance(c, type) and 'simulate' in c.__dict__]
+    originals = {c: c.__dict__['simulate'] for c in classes}
+    try:
+        for c in classes:
+            c.simulate = counted(originals[c])
+        with contextlib.redirect_stdout(io.StringIO()):
+            simulate(path, opt, 'tree')
+    finally:
+        for c in classes:
+            c.simulate = originals[c]
+    return count[0]
+
+
+# --- com ---
+
+def compile_and_run(path: str, opt: int, backend: str, runs: int, expected: Optional[str]) -> dict:
+    '''wall time of "main.py com" (startup, codegen and assembling), size and run time of the binary,
+    its output is compared with expected unless that is None'''
+    binary = os.path.splitext(path)[0]
+    cmd = [sys.executable, MAIN, 'com', '--no-cache', f'-O{opt}', '--backend', backend, path]
+    start = time.perf_counter()
+    p = subprocess.run(cmd, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    seconds = time.perf_counter() - start
+    if p.returncode != 0 or not os.path.exists(binary):
+        lines = p.stderr.decode('utf-8').strip().splitlines()
+        return {'error': lines[-1] if lines else f'exit status {p.returncode}'}
+
+    out = subprocess.run([binary], stdout=subprocess.PIPE).stdout.decode('utf-8')
+    native = median_time(lambda: subprocess.run([binary], stdout=subprocess.DEVNULL), runs)
+    return {'seconds': seconds, 'binary_bytes': os.path.getsize(binary),
+            'run_seconds': native, 'output_matches': out == expected if expected is not None else None}
+
+
+# --- results ---
+
+def bench(path: str, args) -> dict:
+    with open(path, 'r') as f:
+        lines = sum(1 for _ in f)
+    result = {'lines': lines, 'parse_seconds': median_time(lambda: parse_file(path, args.opt), args.runs)}
+    result['nodes'] = count_nodes(path, args.opt)
+
+    result['sim'] = {}
+    output = None
+    for engine in ENGINES:
+        times = []
+        for _ in range(args.runs):
+            seconds, output = simulate(path, args.opt, engine)
+            times.append(seconds)
+        seconds = statistics.median(times)
+        result['sim'][engine] = {'seconds': seconds, 'nodes_per_second': result['nodes'] / seconds}
+
+    if not args.no_com:
+        name = os.path.splitext(os.path.basename(path))[0]
+        expected = output if name not in OUTPUT_DIFFERS else None
+        result['com'] = compile_and_run(path, args.opt, args.backend, args.runs, expected)
+    return result
+
+
+def commit() -> str:
+    try:
+        p = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, check=True)
+        head = p.stdout.decode('utf-8').strip()
+        p = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=ROOT, capture_output=True)
+        return head + ('-dirty' if p.stdout.strip() else '')
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def ms(seconds) -> str:
+    return f'{seconds * 1000:9.1f}' if seconds is not None else f'{"-":>9}'
+
+
+def report(results: dict):
+    print(f'{"program":10} {"parse ms":>9} {"nodes":>9} {"vm ms":>9} {"vm n/s":>9} {"tree ms":>9} '
+          f'{"tree n/s":>9} {"com ms":>9} {"binary":>9} {"run ms":>9}')
+    for name, r in results['programs'].items():
+        vm, tree = r['sim']['vm'], r['sim']['tree']
+        com = r.get('com', {})
+        size = f'{com["binary_bytes"]:9}' if 'binary_bytes' in com else f'{"-":>9}'
+        print(f'{name:10} {ms(r["parse_seconds"])} {r["nodes"]:9} {ms(vm["seconds"])} '
+              f'{vm["nodes_per_second"]:9.3g} {ms(tree["seconds"])} {tree["nodes_per_second"]:9.3g} '
+              f'{ms(com.get("seconds"))} {size} {ms(com.get("run_seconds"))}')
+        if 'error' in com:
+            print(f'  com failed: {com["error"]}')
+        elif com and com['output_matches'] is False:
+            print(f'  the output of the binary differs from sim')
+
+
+# metrics compared between two result files
+METRICS = [
+    ('parse', lambda r: r['parse_seconds']),
+    ('vm', lambda r: r['sim']['vm']['seconds']),
+    ('tree', lambda r: r['sim']['tree']['seconds']),
+    ('com', lambda r: r['com']['seconds']),
+    ('binary', lambda r: r['com']['binary_bytes']),
+    ('run', lambda r: r['com']['run_seconds']),
+]
+
+
+def compare(old: dict, new: dict):
+    '''prints new / old for every metric both results have, below 1.00 is an improvement'''
+    print(f'\n{new["commit"]} against {old["commit"]} (new / old, lower is better)')
+    print(f'{"program":10} ' + ' '.join(f'{name:>7}' for name, _ in METRICS))
+    for name, r in new['programs'].items():
+        before = old['programs'].get(name)
+        if before is None:
+            continue
+        ratios = []
+        for _, metric in METRICS:
+            try:
+                ratios.append(f'{metric(r) / metric(before):7.2f}')
+            except (KeyError, ZeroDivisionError):
+                ratios.append(f'{"-":>7}')
+        print(f'{name:10} ' + ' '.join(ratios))
+
+
+def main(args) -> int:
+    names = args.programs or sorted(os.path.splitext(f)[0] for f in os.listdir(PROGRAMS) if f.endswith('.f')) + ['generated']
+    results = {
+        'commit': commit(),
+        'date': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'opt': args.opt,
+        'backend': None if args.no_com else args.backend,
+        'runs': args.runs,
+        'programs': {},
+    }
+
+    # the programs are copied so the .asm files and binaries of com stay out of the tree
+    directory = tempfile.mkdtemp(prefix='stacky-bench-')
+    try:
+        for name in names:
+            path = os.path.join(directory, name + '.f')
+            if name == 'generated':
+                generate(path, args.words)
+            else:
+                shutil.copy(os.path.join(PROGRAMS, name + '.f'), path)
+            print(f'running {name}', file=sys.stderr)
+            results['programs'][name] = bench(path, args)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    report(results)
+    out = args.out or os.path.join(RESULTS, f'{results["commit"]}.json')
+    if os.path.dirname(out):
+        os.makedirs(os.path.dirname(out), exist_ok=True)
+    with open(out, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f'results written to {out}', file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            compare(json.load(f), results)
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        usage='python3 bench/run.py [program ...]',
+        epilog='Programs are the files in bench/programs and "generated", a large generated source.')
+    parser.add_argument('programs', nargs='*', metavar='program',
+                        help='programs to run (default all of them and "generated")')
+    parser.add_argument('-n', dest='runs', type=int, default=3, help='number of runs, the median counts (default 3)')
+    parser.add_argument('-O', dest='opt', type=int, choices=[0, 1], default=1, help='optimization level (default 1)')
+    parser.add_argument('--backend', choices=['nasm', 'builtin'], default='nasm',
+                        help='assembler of com (default nasm)')
+    parser.add_argument('--no-com', action='store_true', help='only measure the front end and sim')
+    parser.add_argument('--words', type=int, default=5000,
+                        help='number of words of the generated source (default 5000)')
+    parser.add_argument('-o', '--out', help='result file (default bench/results/<commit>.json)')
+    parser.add_argument('--compare', metavar='FILE', help='earlier result file to compare with')
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,79 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# measures how long "main.py sim" needs for a trivial program, which is all startup
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAIN = os.path.join(ROOT, 'main.py')
+
+# modules of the other modes, sim must not import them
+BACKEND = ['src.codegen', 'src.assembler', 'src.peephole', 'src.cache', 'src.server', 'src.repl', 'src.profiler',
+           'subprocess', 'concurrent.futures', 'socketserver']
+
+# default budget for the import time of sim in milliseconds
+BUDGET = 100
+
+
+def import_times(path: str):
+    '''runs sim with -X importtime, returns {module: self time in us}'''
+    cmd = [sys.executable, '-X', 'importtime', MAIN, 'sim', path]
+    p = subprocess.run(cmd, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, check=True)
+    modules = {}
+    for line in p.stderr.decode('utf-8').splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_time, _, name = line[len('import time:'):].split('|')
+        modules[name.strip()] = int(self_time)
+    return modules
+
+
+def wall_time(path: str) -> float:
+    start = time.perf_counter()
+    subprocess.run([sys.executable, MAIN, 'sim', path], cwd=ROOT, stdout=subprocess.DEVNULL, check=True)
+    return time.perf_counter() - start
+
+
+def main(args) -> int:
+    with tempfile.NamedTemporaryFile('w', suffix='.f') as f:
+        f.write('1 2 + .\n')
+        f.flush()
+        runs = [import_times(f.name) for _ in range(args.runs)]
+        walls = [wall_time(f.name) for _ in range(args.runs)]
+
+    imports = statistics.median(sum(run.values()) for run in runs) / 1000
+    ours = statistics.median(sum(v for k, v in run.items() if k.startswith('src')) for run in runs) / 1000
+    wall = statistics.median(walls) * 1000
+    loaded = sorted(set(BACKEND) & set(runs[0]))
+
+    print(f'sim startup ({args.runs} runs, median)')
+    print(f'  wall time    {wall:7.1f} ms')
+    print(f'  imports      {imports:7.1f} ms (budget {args.budget} ms)')
+    print(f'  src modules  {ours:7.1f} ms')
+    if args.verbose:
+        for name, us in sorted(runs[0].items(), key=lambda item: -item[1])[:15]:
+            print(f'    {us / 1000:7.1f} ms  {name}')
+
+    status = 0
+    if loaded:
+        print(f'sim imports modules of other modes: {", ".join(loaded)}', file=sys.stderr)
+        status = 1
+    if imports > args.budget:
+        print(f'import time {imports:.1f} ms is over the budget of {args.budget} ms', file=sys.stderr)
+        status = 1
+    return status
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        usage='python3 bench/startup.py',
+        epilog='Fails if sim imports backend modules or its imports take longer than the budget.')
+    parser.add_argument('-n', dest='runs', type=int, default=10, help='number of runs (default 10)')
+    parser.add_argument('--budget', type=float, default=BUDGET,
+                        help=f'import time budget of sim in ms (default {BUDGET})')
+    parser.add_argument('-v', '--verbose', action='store_true', help='list the slowest imports')
+    sys.exit(main(parser.parse_args()))
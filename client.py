@@ -0,0 +1,46 @@
+import argparse
+import json
+import os
+import socket
+import sys
+
+# thin client for "python3 main.py serve", only the standard library is imported so
+# starting it stays cheap
+
+
+def main(args) -> int:
+    options = {'engine': args.engine, 'opt': args.opt, 'stack_size': args.stack_size}
+    options = {k: v for k, v in options.items() if v is not None}
+    if args.file == '-':
+        request = {'name': '<stdin>', 'source': sys.stdin.read(), 'options': options}
+    else:
+        request = {'path': os.path.abspath(args.file), 'options': options}
+
+    path = args.socket or os.environ.get('STACKY_SOCKET') or f'/tmp/stacky-{os.getuid()}.sock'
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.connect(path)
+        s.sendall(json.dumps(request).encode('utf-8'))
+        s.shutdown(socket.SHUT_WR)
+        data = b''
+        while True:
+            chunk = s.recv(1 << 16)
+            if not chunk:
+                break
+            data += chunk
+
+    answer = json.loads(data.decode('utf-8'))
+    sys.stdout.write(answer['stdout'])
+    sys.stderr.write(answer['stderr'])
+    return answer['status']
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        usage='python3 client.py file',
+        epilog='Runs the file on a server started with "python3 main.py serve".')
+    parser.add_argument('file', help='program to simulate, - reads it from stdin')
+    parser.add_argument('--socket', help='unix socket of the server (default $STACKY_SOCKET or /tmp/stacky-<uid>.sock)')
+    parser.add_argument('--engine', choices=['vm', 'tree'])
+    parser.add_argument('-O', dest='opt', type=int, choices=[0, 1])
+    parser.add_argument('--stack-size', type=int)
+    sys.exit(main(parser.parse_args()))
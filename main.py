@@ -1,139 +1,264 @@
-from src.nodes import *
-from enum import Enum
-from typing import List
+from typing import List, Optional
+import argparse
 import sys
-import subprocess
+import os
+import time
 
+from src.analysis import Analyzer
+from src.error import Error
 from src.lexer import Lexer
+from src.optimizer import optimize_statements
 from src.parser import Parser
 from src.prog import Program
+from src.stack import ArrayStack
+from src.trace import LEVELS, OFF, Tracer
+from src import vm
 
+# the code generator, assembler, build cache, process pool, server and repl are imported
+# by the modes that use them, sim only loads the front end and the interpreters
 
-def simulate_program(prog: Program):
-    while prog.index < len(prog.nodes):
-        prog.nodes[prog.index].simulate(prog)
-        prog.index += 1
-
-
-def compile_program(prog: Program):
-    filename = sys.argv[2].split('.')[0] + ".asm"
-    with open(filename, 'w') as f:
-        f.write("BITS 64\n")
-        f.write("section .text\n")
-        f.write("print:\n")
-        f.write("    mov r9, -3689348814741910323\n")
-        f.write("    sub rsp, 40\n")
-        f.write("    mov BYTE [rsp+31], 10\n")
-        f.write("    lea rcx, [rsp+30]\n")
-        f.write(".L2:\n")
-        f.write("    mov rax, rdi\n")
-        f.write("    lea r8, [rsp+32]\n")
-        f.write("    mul r9\n")
-        f.write("    mov rax, rdi\n")
-        f.write("    sub r8, rcx\n")
-        f.write("    shr rdx, 3\n")
-        f.write("    lea rsi, [rdx+rdx*4]\n")
-        f.write("    add rsi, rsi\n")
-        f.write("    sub rax, rsi\n")
-        f.write("    add eax, 48\n")
-        f.write("    mov BYTE [rcx], al\n")
-        f.write("    mov rax, rdi\n")
-        f.write("    mov rdi, rdx\n")
-        f.write("    mov rdx, rcx\n")
-        f.write("    sub rcx, 1\n")
-        f.write("    cmp rax, 9\n")
-        f.write("    ja  .L2\n")
-        f.write("    lea rax, [rsp+32]\n")
-        f.write("    mov edi, 1\n")
-        f.write("    sub rdx, rax\n")
-        f.write("    xor eax, eax\n")
-        f.write("    lea rsi, [rsp+32+rdx]\n")
-        f.write("    mov rdx, r8\n")
-        f.write("    mov rax, 1\n")
-        f.write("    syscall\n")
-        f.write("    add rsp, 40\n")
-        f.write("    ret\n")
-        f.write(f'puts:\n')
-        f.write(f'    mov rax, 0x1\n')
-        f.write(f'    mov rdi, 0x1\n')
-        # f.write(f'    mov rsi, address\n') move string address to rsi
-        # f.write(f'    mov rdx, length\n') move string length to rdx
-        f.write(f'    syscall\n')
-        f.write(f'    ret\n')
-        f.write(f'global _start\n')
-        f.write(f'_start:\n')
-
-        while prog.index < len(prog.nodes):
-            asm = prog.nodes[prog.index].compile(prog)
-            prog.index += 1
-            f.write(asm)
-
-        # exit
-        f.write(f'; --- exit ---\n')
-        f.write(f'    mov rax, 60\n')
-        f.write(f'    mov rdi, 0\n')
-        f.write(f'    syscall\n')
-
-        # string content
-        f.write(f'section .data\n')
-        f.write(f';---- strings ----\n')
-        for string in prog.strings:
-            f.write(f'{string}\n')
-
-        # counter variables
-        f.write(f';---- counters ----\n')
-        for counter in prog.counters:
-            f.write(f'{counter} DQ 0\n')
-
-    compile(filename)
-
-
-def compile(filename: str):
-    cmd = f'nasm -f elf64 {filename}'
-    subprocess.run(cmd.split())
-    link(filename.split('.')[0] + ".o")
-
-
-def link(filename: str):
-    cmd = f'ld -s -o {filename.split(".")[0]} {filename}'
-    subprocess.call(cmd.split())
-
-
-def main():
-    lines = []
-    path = sys.argv[2]
-    with open(path, 'r') as f:
-        lines = f.readlines()
+
+def interpret_program(prog: Program, statements, analyzer: Analyzer):
+    '''walks the nodes and simulates them one by one (reference engine)'''
+    for node in statements:
+        # statements proven safe run without operand checks
+        prog.checked = not analyzer.verify(node, len(prog.stack))
+        prog.body = [node]
+        prog.index = 0
+        prog.run()
+
+
+def simulate_program(prog: Program, statements, engine: str = 'vm'):
+    analyzer = Analyzer(prog.stack.capacity)
+    if engine == 'tree':
+        interpret_program(prog, statements, analyzer)
+    else:
+        vm.simulate_statements(prog, statements, analyzer)
+
+
+def make_tracer(path: str, args, many: bool = False) -> Tracer:
+    '''tracer of a single file, in builds of several files each one traces into its own file'''
+    out = args.trace_out
+    if many and out != '-':
+        out = f'{out}.{os.path.basename(os.path.splitext(path)[0])}'
+    return Tracer(LEVELS[args.trace], out, args.trace_format, path if many else None)
+
+
+def instrument_out(path: str, args) -> Optional[str]:
+    '''where an instrumented binary writes its counters, '-' for stderr, None without instrumentation'''
+    if args.instrument_out is None:
+        return '-' if args.instrument else None
+    if len(args.files) > 1:
+        return f'{args.instrument_out}.{os.path.basename(os.path.splitext(path)[0])}'
+    return args.instrument_out
+
+
+def build(path: str, args, many: bool = False):
+    '''simulates or compiles a single file'''
+    tracer = make_tracer(path, args, many)
+    try:
+        base = os.path.splitext(path)[0]
+        cache = None
+        if args.mode == "com" and not args.no_cache:
+            from src.cache import BuildCache
+            # unchanged programs reuse the assembly, object file and binary of their last build
+            cache = BuildCache(args.cache_dir, args.cache_size << 20)
+            key = cache.key(path, [f'-O{args.opt}', args.backend, f'instrument={instrument_out(path, args)}'])
+            if cache.restore(key, base):
+                if tracer.level != OFF:
+                    tracer.event('cache', 'hit', key=key)
+                return
+            since = time.time()
+        if args.mode == "sim" and not args.no_stkc:
+            simulate_precompiled(path, args, tracer)
+            return
+
+        with open(path, 'r') as f:
+            process(path, f, args, tracer)
+        if cache is not None:
+            cache.store(key, base, since)
+    finally:
+        tracer.close()
+
+
+def parse(path: str, lines, args, tracer: Tracer):
+    '''returns the statements of lines, which are parsed as they are pulled, the dictionary
+    and the string pool'''
+    # every phase pulls from the one before it, tracing wraps them only when it is on
     lexer = Lexer(path, lines)
-    tokens = lexer.get_program()
-    with open('./debug/lexer', 'w') as f:
-        for tok in tokens:
-            f.write(f'{tok}\n')
-    parser = Parser(tokens)
-    program = parser.parse()
-    with open('./debug/parser', 'w') as f:
-        for node in program.nodes:
-            f.write(f'{node}\n')
-    if sys.argv[1] == "sim":
-        simulate_program(program)
-    elif sys.argv[1] == "com":
-        compile_program(program)
+    parser = Parser(tracer.tokens(lexer.tokens()))
+    statements = tracer.nodes('parser', parser.statements())
+    if args.opt >= 1:
+        statements = tracer.nodes('optimizer', optimize_statements(statements))
+    return statements, parser.dict, parser.strings
+
+
+def execute(path: str, statements, words, strings, args, tracer: Tracer):
+    '''runs or compiles statements one by one'''
+    if args.mode == "sim" and (args.profile or args.profile_out):
+        profile_program(path, statements, words, strings, args, tracer)
+        return
+    program = Program([], words, ArrayStack(args.stack_size), strings)
+    # -O1 keeps the top two stack items in registers in compiled code
+    program.cache_size = 2 if args.opt >= 1 else 0
+    if args.mode == "sim":
+        simulate_program(program, tracer.statements('runtime', statements, program), args.engine)
+    elif args.mode == "com":
+        from src.codegen import compile_program
+        compile_program(program, tracer.statements('codegen', statements), path, args.opt >= 1, args.stats, args.backend,
+                        instrument_out(path, args))
+
+
+def profile_program(path: str, statements, words, strings, args, tracer: Tracer):
+    '''simulates statements on the tree engine and reports where the time went'''
+    from src.profiler import ProfiledProgram
+    # statements are parsed as they run like without the profiler, it leaves the parsing out
+    program = ProfiledProgram([], words, ArrayStack(args.stack_size), strings)
+    try:
+        simulate_program(program, tracer.statements('runtime', statements, program), 'tree')
+    finally:
+        # a program that failed is reported up to the error
+        program.stop()
+        program.report()
+        if args.profile_out:
+            out = args.profile_out
+            if len(args.files) > 1:
+                out = f'{out}.{os.path.basename(os.path.splitext(path)[0])}'
+            program.write_stacks(out)
+
+
+def process(path: str, lines, args, tracer: Optional[Tracer] = None):
+    '''lexes, parses and runs / compiles lines statement by statement'''
+    tracer = tracer or Tracer()
+    statements, words, strings = parse(path, lines, args, tracer)
+    execute(path, statements, words, strings, args, tracer)
+
+
+def simulate_precompiled(path: str, args, tracer: Tracer):
+    '''simulates path from its .stkc file, a run that had to parse writes the file'''
+    from src import stkc
+    target = stkc.stkc_path(path, args.stkc_dir)
+    start = time.perf_counter()
+    loaded = stkc.load(path, target, args.opt)
+    if loaded is not None:
+        if tracer.level != OFF:
+            tracer.event('stkc', 'hit', path=target, seconds=round(time.perf_counter() - start, 6))
+        statements, words, strings = loaded
+        execute(path, statements, words, strings, args, tracer)
+        return
+
+    before = stkc.stat(path)
+    recorder = stkc.Recorder()
+    with open(path, 'r') as f:
+        statements, words, strings = parse(path, f, args, tracer)
+        execute(path, recorder.record(statements), words, strings, args, tracer)
+    stkc.save(path, target, args.opt, before, recorder, words, strings)
+    if tracer.level != OFF:
+        tracer.event('stkc', 'write', path=target)
+
+
+def serve_program(args):
+    '''returns the function the server runs programs with, requests may override some options'''
+    def run(path: str, lines, options):
+        request = argparse.Namespace(**vars(args))
+        request.mode = 'sim'
+        for name in ('engine', 'opt', 'stack_size'):
+            if name in options:
+                setattr(request, name, options[name])
+        process(path, lines, request)
+    return run
+
+
+def build_one(path: str, args):
+    '''builds a file of a multi file build, returns the error message or None'''
+    import subprocess
+    try:
+        build(path, args, True)
+    except (Error, OSError, subprocess.CalledProcessError) as error:
+        return f'{path}: {error}'
+    return None
+
+
+def build_all(paths: List[str], args) -> int:
+    '''compiles several files in a process pool, nasm and ld of different files run concurrently'''
+    jobs = args.jobs or os.cpu_count() or 1
+    if jobs == 1:
+        errors = [build_one(path, args) for path in paths]
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=min(jobs, len(paths))) as pool:
+            errors = list(pool.map(build_one, paths, [args] * len(paths)))
+    errors = [error for error in errors if error is not None]
+    for error in errors:
+        print(error, file=sys.stderr)
+    if errors:
+        print(f'{len(errors)} of {len(paths)} files failed', file=sys.stderr)
+    return 1 if errors else 0
+
+
+def main(args) -> int:
+    if args.mode == "serve":
+        from src.server import serve
+        # keeps everything imported and simulates programs sent by client.py
+        return serve(serve_program(args), args.socket)
+    if args.mode == "repl":
+        from src.repl import repl
+        return repl(args)
+    if args.mode == "com" and len(args.files) > 1:
+        return build_all(args.files, args)
+    # simulations run one after the other, their output would interleave otherwise
+    for path in args.files:
+        build(path, args)
+    return 0
 
 
 if __name__ == "__main__":
-    if len(sys.argv) == 2:
-        if(sys.argv[1] == "--help" or sys.argv[1] == "-h"):
-            print("usage: python3 main.py [sim/com] file")
-            print("sim : simulates the input file")
-            print("com : compiles the input file to x86 64 assembly and linkes it.")
-            print("")
-            print("In simulation mode you will get error handling.")
-            quit()
-    elif len(sys.argv) < 3:
-        print("Not enough parameters. Try --help")
-        quit()
-
-    if(sys.argv[1] != "sim" and sys.argv[1] != "com"):
-        print("First argument must be sim or com. Check python3 main.py --help")
-        quit()
-    main()
+    parser = argparse.ArgumentParser(
+        usage='python3 main.py [sim/com] file [file ...] | repl | serve',
+        epilog='In simulation mode you will get error handling.')
+    parser.add_argument('mode', choices=['sim', 'com', 'repl', 'serve'],
+                        help='sim : simulates the input file, com : compiles the input file to x86 64 assembly and linkes it, repl : simulates lines as they are typed, serve : simulates programs sent by client.py.')
+    parser.add_argument('files', nargs='*', metavar='file')
+    parser.add_argument('-j', '--jobs', type=int, default=0,
+                        help='com: number of files compiled in parallel (default: number of cpus)')
+    parser.add_argument('--engine', choices=['vm', 'tree'], default='vm',
+                        help='sim engine: flat bytecode vm (default) or the node walking interpreter')
+    parser.add_argument('-O', dest='opt', type=int, choices=[0, 1], default=1,
+                        help='-O0 runs the nodes as parsed, -O1 (default) folds constants, removes no-op shuffles, caches the top of the stack in registers and runs the peephole optimizer (com)')
+    parser.add_argument('--stack-size', type=int, default=1 << 16,
+                        help='capacity of the simulated data stack (64 bit cells)')
+    parser.add_argument('--backend', choices=['nasm', 'builtin'], default='nasm',
+                        help='com: assemble and link with nasm and ld (default) or write the executable directly')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='com: always rebuild instead of reusing an earlier build of the same source')
+    parser.add_argument('--cache-dir',
+                        help='com: build cache directory (default $STACKY_CACHE_DIR or ~/.cache/stacky)')
+    parser.add_argument('--cache-size', type=int, default=256,
+                        help='com: size limit of the build cache in MiB, least recently used builds are removed first')
+    parser.add_argument('--no-stkc', action='store_true',
+                        help='sim: always lex and parse instead of loading the precompiled .stkc file of the source')
+    parser.add_argument('--stkc-dir',
+                        help='sim: keep the .stkc files in this directory instead of next to the sources')
+    parser.add_argument('--stats', action='store_true',
+                        help='com: print what the peephole optimizer removed to stderr')
+    parser.add_argument('--trace', choices=list(LEVELS), default='off',
+                        help='trace the lexer, parser, optimizer and runtime / codegen phases: a summary per phase or every token, node and statement (default off)')
+    parser.add_argument('--trace-out', default='-',
+                        help='file the trace is written to, - is stderr (default). builds of several files append the file name')
+    parser.add_argument('--trace-format', choices=['text', 'json'], default='text',
+                        help='one "phase event key=value" line (default) or one json object per event')
+    parser.add_argument('--profile', action='store_true',
+                        help='sim: run on the tree engine and report the time per word and the simulated nodes per type and line on stderr')
+    parser.add_argument('--profile-out', metavar='FILE',
+                        help='sim: also write collapsed stacks for flamegraph tools to FILE (implies --profile)')
+    parser.add_argument('--instrument', action='store_true',
+                        help='com: count word calls, loop iterations and if branches, the binary writes the counts to stderr at exit')
+    parser.add_argument('--instrument-out', metavar='FILE',
+                        help='com: the instrumented binary writes its counts to FILE instead (implies --instrument)')
+    parser.add_argument('--socket',
+                        help='serve: unix socket to listen on (default $STACKY_SOCKET or /tmp/stacky-<uid>.sock)')
+    # options may come before, between or after the files
+    args = parser.parse_intermixed_args()
+    if args.mode not in ('repl', 'serve') and not args.files:
+        parser.error('no input file')
+    sys.exit(main(args))
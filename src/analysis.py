@@ -0,0 +1,190 @@
+from typing import Dict, List, Optional, Set
+from src.error import NotEnoughOperantsError
+from src.nodes import *
+
+
+class Effect():
+    '''stack effect of a node or a sequence of nodes
+
+    need: depth that is enough to run without underflow (None if it can not be proven)
+    must: depth without which every path underflows
+    net:  change of the depth (None if it differs between paths)
+    peak: highest depth above the start (None if unbounded or unknown)
+    '''
+    __slots__ = ('need', 'must', 'net', 'peak')
+
+    def __init__(self, need: Optional[int], must: int, net: Optional[int], peak: Optional[int]) -> None:
+        self.need = need
+        self.must = must
+        self.net = net
+        self.peak = peak
+
+    def then(self, other: 'Effect') -> 'Effect':
+        '''effect of running self followed by other'''
+        if self.net is None:
+            # the depth afterwards is unknown, other is only safe if it needs nothing
+            need = self.need if other.need == 0 else None
+            return Effect(need, self.must, None, None)
+        need = None
+        if self.need is not None and other.need is not None:
+            need = max(self.need, other.need - self.net)
+        must = max(self.must, other.must - self.net)
+        net = None if other.net is None else self.net + other.net
+        peak = None
+        if self.peak is not None and other.peak is not None:
+            peak = max(self.peak, self.net + other.peak)
+        return Effect(need, must, net, peak)
+
+    def either(self, other: 'Effect') -> 'Effect':
+        '''effect of running self or other'''
+        need = None
+        if self.need is not None and other.need is not None:
+            need = max(self.need, other.need)
+        net = self.net if self.net == other.net else None
+        peak = None
+        if self.peak is not None and other.peak is not None:
+            peak = max(self.peak, other.peak)
+        return Effect(need, min(self.must, other.must), net, peak)
+
+    def __repr__(self) -> str:
+        return f'Effect(need={self.need}, must={self.must}, net={self.net}, peak={self.peak})'
+
+
+def simple(pops: int, pushes: int) -> Effect:
+    return Effect(pops, pops, pushes - pops, max(0, pushes - pops))
+
+
+NOTHING = simple(0, 0)
+UNKNOWN = Effect(None, 0, None, None)
+
+EFFECTS = {
+    NodeNumber: simple(0, 1),
+    NodeString: simple(0, 2),
+    NodeCarriageReturn: simple(0, 2),
+    NodeAdd: simple(2, 1),
+    NodeSubtract: simple(2, 1),
+    NodeMultiply: simple(2, 1),
+    NodeDivide: simple(2, 1),
+    NodeMod: simple(2, 1),
+    NodeEquals: simple(2, 1),
+    NodeLessThan: simple(2, 1),
+    NodeGreaterThan: simple(2, 1),
+    NodeAnd: simple(2, 1),
+    NodeOr: simple(2, 1),
+    NodeInvert: simple(1, 1),
+    NodeDupilcate: simple(1, 2),
+    NodeSwap: simple(2, 2),
+    NodeDrop: simple(1, 0),
+    NodePrint: simple(1, 0),
+    NodeEmit: simple(1, 0),
+    NodePuts: simple(2, 0),
+    NodeDebugStack: NOTHING,
+    NodeDebugDict: NOTHING,
+    NodeWord: NOTHING,
+    NodeIf: NOTHING,
+    NodeLoop: NOTHING,
+}
+
+COUNTER = simple(0, 1)
+CONDITION = simple(1, 0)
+BOUNDS = simple(2, 0)
+
+
+class Analyzer():
+    '''computes stack effects of top level statements and the words they call'''
+
+    def __init__(self, capacity: int) -> None:
+        self.capacity = capacity
+        self.dict: Dict[str, Node] = {}
+        # effect of each word body and its maximum stack depth
+        self.words: Dict[str, Effect] = {}
+        self.running: Set[str] = set()
+        self.missing: Set[str] = set()
+
+    def verify(self, node: Node, depth: int) -> bool:
+        '''checks a top level statement before it runs on a stack of the given depth
+
+        raises NotEnoughOperantsError if it underflows on every path, returns True
+        if it is proven to neither underflow nor overflow.
+        '''
+        effect = self.effect(node, False)
+        if effect.must > depth:
+            token = node.token
+            raise NotEnoughOperantsError(token.file_name, token.line_number, effect.must)
+        if effect.need is None or effect.peak is None:
+            return False
+        return effect.need <= depth and depth + effect.peak <= self.capacity
+
+    def sequence(self, nodes: List[Node], in_loop: bool) -> Effect:
+        effect = NOTHING
+        for node in nodes:
+            effect = effect.then(self.effect(node, in_loop))
+        return effect
+
+    def effect(self, node: Node, in_loop: bool) -> Effect:
+        effect = EFFECTS.get(type(node))
+        if effect is not None:
+            if isinstance(node, (NodeWord, NodeIf, NodeLoop)):
+                self.define(node)
+            return effect
+        if isinstance(node, NodeCall) and in_loop and node.name in ('i', 'j', 'k'):
+            return COUNTER
+        if isinstance(node, (NodeCall, NodeCallIf)):
+            return self.call(node.name)
+        return UNKNOWN
+
+    def define(self, node: Node):
+        # effects computed with an older or missing definition are stale now
+        if node.name in self.dict or node.name in self.missing:
+            self.words.clear()
+            self.missing.clear()
+        self.dict[node.name] = node
+
+    def call(self, name: str) -> Effect:
+        effect = self.words.get(name)
+        if effect is not None:
+            return effect
+        node = self.dict.get(name)
+        if node is None:
+            # fails with NotDefinedError when reached
+            self.missing.add(name)
+            return UNKNOWN
+        if name in self.running:
+            # recursion, the depth depends on the data
+            return UNKNOWN
+
+        self.running.add(name)
+        try:
+            effect = self.definition(node)
+        finally:
+            self.running.discard(name)
+        self.words[name] = effect
+        return effect
+
+    def definition(self, node: Node) -> Effect:
+        if isinstance(node, NodeWord):
+            return self.sequence(node.content, False)
+
+        if isinstance(node, NodeIf):
+            if node.condition == []:
+                return UNKNOWN
+            effect = self.sequence(node.condition, False).then(CONDITION)
+            branches = self.sequence(node.content, False).either(self.sequence(node.else_part, False))
+            return effect.then(branches)
+
+        if isinstance(node, NodeLoop):
+            effect = self.sequence(node.content, False).then(BOUNDS)
+            body = self.sequence(node.body, True)
+            runs = False
+            if len(node.content) == 2 and all(isinstance(el, NodeNumber) for el in node.content):
+                runs = int(node.content[1].token.value) < int(node.content[0].token.value)
+            if body.net == 0:
+                loop = Effect(body.need, body.must if runs else 0, 0, body.peak)
+            elif body.net is not None and body.net > 0:
+                # the first iteration needs the most, the depth grows with every iteration
+                loop = Effect(body.need, body.must if runs else 0, None, None)
+            else:
+                loop = UNKNOWN
+            return effect.then(loop)
+
+        return UNKNOWN
@@ -0,0 +1,489 @@
+import os
+import re
+import struct
+from typing import Dict, List, Optional, Tuple
+from src.error import AssemblerError
+
+# encodes the nasm subset the compiler emits to x86 64 machine code and writes a
+# static ELF64 executable, no object file and no linker are involved
+
+REGISTERS = {}
+for i, name in enumerate(['rax', 'rcx', 'rdx', 'rbx', 'rsp', 'rbp', 'rsi', 'rdi']):
+    REGISTERS[name] = (i, 64)
+    REGISTERS['e' + name[1:]] = (i, 32)
+for i, name in enumerate(['al', 'cl', 'dl', 'bl', 'spl', 'bpl', 'sil', 'dil']):
+    REGISTERS[name] = (i, 8)
+for i in range(8, 16):
+    REGISTERS[f'r{i}'] = (i, 64)
+    REGISTERS[f'r{i}d'] = (i, 32)
+    REGISTERS[f'r{i}b'] = (i, 8)
+
+CONDITIONS = {
+    'o': 0x0, 'no': 0x1, 'b': 0x2, 'c': 0x2, 'nae': 0x2, 'ae': 0x3, 'nb': 0x3, 'nc': 0x3,
+    'e': 0x4, 'z': 0x4, 'ne': 0x5, 'nz': 0x5, 'be': 0x6, 'na': 0x6, 'a': 0x7, 'nbe': 0x7,
+    's': 0x8, 'ns': 0x9, 'p': 0xA, 'pe': 0xA, 'np': 0xB, 'po': 0xB,
+    'l': 0xC, 'nge': 0xC, 'ge': 0xD, 'nl': 0xD, 'le': 0xE, 'ng': 0xE, 'g': 0xF, 'nle': 0xF,
+}
+
+# opcode extension of the instructions sharing the 0x01 / 0x81 / 0x83 encodings
+ARITHMETIC = {'add': 0, 'or': 1, 'adc': 2, 'sbb': 3, 'and': 4, 'sub': 5, 'xor': 6, 'cmp': 7}
+SHIFTS = {'rol': 0, 'ror': 1, 'shl': 4, 'sal': 4, 'shr': 5, 'sar': 7}
+# single operand instructions encoded as 0xF7 / 0xFF with an opcode extension
+UNARY = {'not': (0xF7, 2), 'neg': (0xF7, 3), 'mul': (0xF7, 4), 'div': (0xF7, 6), 'idiv': (0xF7, 7),
+         'inc': (0xFF, 0), 'dec': (0xFF, 1)}
+SIMPLE = {'ret': b'\xc3', 'syscall': b'\x0f\x05', 'nop': b'\x90', 'cqo': b'\x48\x99'}
+
+SIZES = {'byte': 8, 'word': 16, 'dword': 32, 'qword': 64}
+
+# the executable is loaded at BASE, the code follows the ELF and program headers
+BASE = 0x400000
+PAGE = 0x1000
+ELF_HEADER = 64
+PROGRAM_HEADER = 56
+
+
+class Register():
+    __slots__ = ('number', 'size')
+
+    def __init__(self, number: int, size: int) -> None:
+        self.number = number
+        self.size = size
+
+
+class Memory():
+    __slots__ = ('base', 'index', 'scale', 'disp', 'size', 'symbolic')
+
+    def __init__(self) -> None:
+        self.base: Optional[int] = None
+        self.index: Optional[int] = None
+        self.scale = 1
+        self.disp = 0
+        self.size: Optional[int] = None
+        # the displacement depends on a label, its size must not depend on the value
+        self.symbolic = False
+
+
+class Immediate():
+    __slots__ = ('value', 'symbolic')
+
+    def __init__(self, value: int, symbolic: bool) -> None:
+        self.value = value
+        self.symbolic = symbolic
+
+
+def split_comment(line: str) -> str:
+    '''removes a trailing comment, semicolons inside strings are kept'''
+    quote = None
+    for i, c in enumerate(line):
+        if quote:
+            if c == quote:
+                quote = None
+        elif c in '"\'`':
+            quote = c
+        elif c == ';':
+            return line[:i]
+    return line
+
+
+def split_operands(s: str) -> List[str]:
+    '''splits at commas outside of strings'''
+    operands = []
+    quote = None
+    start = 0
+    for i, c in enumerate(s):
+        if quote:
+            if c == quote:
+                quote = None
+        elif c in '"\'`':
+            quote = c
+        elif c == ',':
+            operands.append(s[start:i].strip())
+            start = i + 1
+    if s[start:].strip():
+        operands.append(s[start:].strip())
+    return operands
+
+
+def fits(value: int, bits: int) -> bool:
+    return -(1 << (bits - 1)) <= value < (1 << (bits - 1))
+
+
+def rex(w: int, r: int, x: int, b: int, force: bool = False) -> bytes:
+    value = 0x40 | (w << 3) | ((r >> 3) << 2) | ((x >> 3) << 1) | (b >> 3)
+    return bytes([value]) if value != 0x40 or force else b''
+
+
+class Assembler():
+    '''two pass assembler, instruction sizes never depend on label values'''
+
+    def __init__(self, source: str, file_name: str = '<asm>') -> None:
+        self.file_name = file_name
+        # (section, line number, label or None, mnemonic or None, operands)
+        self.lines: List[Tuple[str, int, Optional[str], Optional[str], List[str]]] = []
+        self.symbols: Dict[str, int] = {}
+        self.parse(source)
+
+    # ------------------
+
+    def error(self, message: str):
+        raise AssemblerError(self.file_name, self.line_number, message)
+
+    def parse(self, source: str):
+        section = '.text'
+        scope = ''
+        for number, line in enumerate(source.splitlines(), 1):
+            self.line_number = number
+            s = split_comment(line).strip()
+            if s == '':
+                continue
+            words = s.split(None, 1)
+            if words[0] == 'section':
+                section = words[1].strip()
+                continue
+            if words[0] in ('global', 'BITS', 'bits', 'default', 'extern'):
+                continue
+
+            label = None
+            m = re.match(r'^([A-Za-z_.][\w.?$@]*)\s*:\s*(.*)$', s)
+            if m is None:
+                # nasm also accepts data labels without a colon
+                m = re.match(r'^([A-Za-z_.][\w.?$@]*)\s+((?:db|dw|dd|dq|resb|resq)\b.*)$', s, re.IGNORECASE)
+            if m is not None:
+                label, s = m.group(1), m.group(2).strip()
+                if not label.startswith('.'):
+                    scope = label
+                else:
+                    label = scope + label
+            mnemonic, operands = None, []
+            if s:
+                words = s.split(None, 1)
+                mnemonic = words[0].lower()
+                operands = split_operands(words[1]) if len(words) > 1 else []
+                if mnemonic not in ('db', 'dw', 'dd', 'dq'):
+                    operands = [re.sub(r'(?<![\w.])(\.\w+)', lambda m: scope + m.group(1), o) for o in operands]
+            self.lines.append((section, number, label, mnemonic, operands))
+
+    # --- operands ------------------
+
+    def value(self, term: str, final: bool) -> Tuple[int, bool]:
+        '''returns the value of a number or label and whether it was a label'''
+        try:
+            return int(term, 0), False
+        except ValueError:
+            pass
+        if re.match(r'^[A-Za-z_.][\w.?$@]*$', term) is None:
+            self.error(f'invalid expression {term}')
+        if term in self.symbols:
+            return self.symbols[term], True
+        if final:
+            self.error(f'undefined label {term}')
+        return 0, True
+
+    def expression(self, s: str, final: bool) -> Tuple[int, bool]:
+        total = 0
+        symbolic = False
+        for sign, term in re.findall(r'([+-]?)\s*([^+\-\s]+)', s.replace(' ', '')):
+            value, label = self.value(term, final)
+            total += -value if sign == '-' else value
+            symbolic = symbolic or label
+        return total, symbolic
+
+    def operand(self, s: str, final: bool):
+        s = s.strip()
+        size = None
+        m = re.match(r'^(byte|word|dword|qword)\s+(?:ptr\s+)?(.*)$', s, re.IGNORECASE)
+        if m is not None:
+            size = SIZES[m.group(1).lower()]
+            s = m.group(2).strip()
+        if s in REGISTERS:
+            return Register(*REGISTERS[s])
+        if s.startswith('[') and s.endswith(']'):
+            mem = Memory()
+            mem.size = size
+            inner = s[1:-1].replace(' ', '')
+            if inner.startswith('rel'):
+                self.error('rip relative addressing is not supported')
+            for sign, term in re.findall(r'([+-]?)([^+\-]+)', inner):
+                if term in REGISTERS and sign != '-':
+                    number, bits = REGISTERS[term]
+                    if bits != 64:
+                        self.error(f'invalid address register {term}')
+                    if mem.base is None:
+                        mem.base = number
+                    elif mem.index is None:
+                        mem.index = number
+                    else:
+                        self.error(f'invalid address {s}')
+                elif '*' in term:
+                    reg, scale = term.split('*')
+                    if reg not in REGISTERS:
+                        reg, scale = scale, reg
+                    if reg not in REGISTERS or mem.index is not None or int(scale) not in (1, 2, 4, 8):
+                        self.error(f'invalid address {s}')
+                    mem.index = REGISTERS[reg][0]
+                    mem.scale = int(scale)
+                else:
+                    value, label = self.value(term, final)
+                    mem.disp += -value if sign == '-' else value
+                    mem.symbolic = mem.symbolic or label
+            if mem.index == 4:
+                # rsp can only be a base
+                if mem.scale != 1 or mem.base == 4:
+                    self.error(f'invalid address {s}')
+                mem.base, mem.index = mem.index, mem.base
+            return mem
+        value, symbolic = self.expression(s, final)
+        return Immediate(value, symbolic)
+
+    # --- encoding ------------------
+
+    def modrm(self, opcode: bytes, reg: int, rm, w: int, byte_regs: bool = False, prefix: bytes = b'') -> bytes:
+        '''opcode followed by the ModRM byte addressing rm, reg is a register number or an extension'''
+        force = byte_regs and ((isinstance(rm, Register) and 4 <= rm.number < 8) or 4 <= reg < 8)
+        if isinstance(rm, Register):
+            return prefix + rex(w, reg, 0, rm.number, force) + opcode + bytes([0xC0 | ((reg & 7) << 3) | (rm.number & 7)])
+
+        index = rm.index if rm.index is not None else 4
+        scale = {1: 0, 2: 1, 4: 2, 8: 3}[rm.scale]
+        disp = rm.disp
+        if rm.base is None:
+            # absolute address through a SIB byte without base
+            body = bytes([0x04 | ((reg & 7) << 3), (scale << 6) | ((index & 7) << 3) | 5]) + struct.pack('<i', disp)
+            return prefix + rex(w, reg, index, 0, force) + opcode + body
+
+        base = rm.base
+        if rm.symbolic or not fits(disp, 8):
+            mod, tail = 2, struct.pack('<i', disp)
+        elif disp == 0 and base & 7 != 5:
+            mod, tail = 0, b''
+        else:
+            mod, tail = 1, struct.pack('<b', disp)
+        if rm.index is None and base & 7 != 4:
+            body = bytes([(mod << 6) | ((reg & 7) << 3) | (base & 7)])
+        else:
+            body = bytes([(mod << 6) | ((reg & 7) << 3) | 4, (scale << 6) | ((index & 7) << 3) | (base & 7)])
+        return prefix + rex(w, reg, index if rm.index is not None else 0, base, force) + opcode + body + tail
+
+    def size_of(self, a, b=None) -> int:
+        for op in (a, b):
+            if isinstance(op, Register):
+                return op.size
+        for op in (a, b):
+            if isinstance(op, Memory) and op.size is not None:
+                return op.size
+        self.error('operation size not specified')
+
+    def encode(self, mnemonic: str, operands: List[str], address: int, final: bool) -> bytes:
+        if mnemonic in SIMPLE and not operands:
+            return SIMPLE[mnemonic]
+
+        # relative jumps and calls always use 32 bit displacements
+        if mnemonic in ('jmp', 'call') or (mnemonic[0] == 'j' and mnemonic[1:] in CONDITIONS):
+            target = self.operand(operands[0], final)
+            if not isinstance(target, Immediate):
+                self.error(f'indirect {mnemonic} is not supported')
+            if mnemonic == 'jmp':
+                opcode = b'\xe9'
+            elif mnemonic == 'call':
+                opcode = b'\xe8'
+            else:
+                opcode = bytes([0x0F, 0x80 | CONDITIONS[mnemonic[1:]]])
+            size = len(opcode) + 4
+            return opcode + struct.pack('<i', target.value - (address + size) if final else 0)
+
+        ops = [self.operand(o, final) for o in operands]
+
+        if mnemonic == 'mov' and len(ops) == 2:
+            return self.mov(*ops)
+        if mnemonic in ARITHMETIC and len(ops) == 2:
+            return self.arithmetic(ARITHMETIC[mnemonic], *ops)
+        if mnemonic == 'push' and len(ops) == 1:
+            op = ops[0]
+            if isinstance(op, Register) and op.size == 64:
+                return rex(0, 0, 0, op.number) + bytes([0x50 | (op.number & 7)])
+            if isinstance(op, Immediate):
+                if not op.symbolic and fits(op.value, 8):
+                    return b'\x6a' + struct.pack('<b', op.value)
+                return b'\x68' + struct.pack('<i', op.value)
+            if isinstance(op, Memory):
+                return self.modrm(b'\xff', 6, op, 0)
+        if mnemonic == 'pop' and len(ops) == 1:
+            op = ops[0]
+            if isinstance(op, Register) and op.size == 64:
+                return rex(0, 0, 0, op.number) + bytes([0x58 | (op.number & 7)])
+            if isinstance(op, Memory):
+                return self.modrm(b'\x8f', 0, op, 0)
+        if mnemonic == 'lea' and len(ops) == 2 and isinstance(ops[0], Register) and isinstance(ops[1], Memory):
+            return self.modrm(b'\x8d', ops[0].number, ops[1], int(ops[0].size == 64))
+        if mnemonic == 'imul':
+            return self.imul(ops)
+        if mnemonic in SHIFTS and len(ops) == 2 and isinstance(ops[1], Immediate):
+            size = self.size_of(ops[0])
+            w = int(size == 64)
+            if ops[1].value == 1:
+                return self.modrm(b'\xd1' if size != 8 else b'\xd0', SHIFTS[mnemonic], ops[0], w, size == 8)
+            return self.modrm(b'\xc1' if size != 8 else b'\xc0', SHIFTS[mnemonic], ops[0], w, size == 8) + bytes([ops[1].value & 0xFF])
+        if mnemonic in UNARY and len(ops) == 1 and not isinstance(ops[0], Immediate):
+            opcode, ext = UNARY[mnemonic]
+            size = self.size_of(ops[0])
+            if size == 8:
+                opcode -= 1
+            return self.modrm(bytes([opcode]), ext, ops[0], int(size == 64), size == 8)
+        if mnemonic.startswith('cmov') and mnemonic[4:] in CONDITIONS and len(ops) == 2 and isinstance(ops[0], Register):
+            opcode = bytes([0x0F, 0x40 | CONDITIONS[mnemonic[4:]]])
+            return self.modrm(opcode, ops[0].number, ops[1], int(ops[0].size == 64))
+        if mnemonic.startswith('set') and mnemonic[3:] in CONDITIONS and len(ops) == 1:
+            opcode = bytes([0x0F, 0x90 | CONDITIONS[mnemonic[3:]]])
+            return self.modrm(opcode, 0, ops[0], 0, True)
+        if mnemonic == 'test' and len(ops) == 2 and isinstance(ops[1], Register):
+            size = ops[1].size
+            return self.modrm(b'\x85' if size != 8 else b'\x84', ops[1].number, ops[0], int(size == 64), size == 8)
+        self.error(f'unsupported instruction {mnemonic} {", ".join(operands)}')
+
+    def mov(self, dst, src) -> bytes:
+        if isinstance(dst, Register) and isinstance(src, Immediate):
+            value = src.value
+            if dst.size == 8:
+                return rex(0, 0, 0, dst.number, 4 <= dst.number < 8) + bytes([0xB0 | (dst.number & 7)]) + bytes([value & 0xFF])
+            if dst.size == 32 or src.symbolic or 0 <= value <= 0xFFFFFFFF:
+                # writing the 32 bit register clears the upper half, labels are below 4 GiB
+                return rex(0, 0, 0, dst.number) + bytes([0xB8 | (dst.number & 7)]) + struct.pack('<I', value & 0xFFFFFFFF)
+            if fits(value, 32):
+                return self.modrm(b'\xc7', 0, dst, 1) + struct.pack('<i', value)
+            return rex(1, 0, 0, dst.number) + bytes([0xB8 | (dst.number & 7)]) + struct.pack('<q', value if value < (1 << 63) else value - (1 << 64))
+        if isinstance(dst, Memory) and isinstance(src, Immediate):
+            size = self.size_of(dst)
+            if size == 8:
+                return self.modrm(b'\xc6', 0, dst, 0) + bytes([src.value & 0xFF])
+            if not src.symbolic and not fits(src.value, 32):
+                self.error('immediate does not fit into 32 bits')
+            return self.modrm(b'\xc7', 0, dst, int(size == 64)) + struct.pack('<i', src.value)
+        if isinstance(src, Register) and not isinstance(dst, Immediate):
+            size = src.size
+            return self.modrm(b'\x89' if size != 8 else b'\x88', src.number, dst, int(size == 64), size == 8)
+        if isinstance(dst, Register) and isinstance(src, Memory):
+            size = dst.size
+            return self.modrm(b'\x8b' if size != 8 else b'\x8a', dst.number, src, int(size == 64), size == 8)
+        self.error('invalid mov')
+
+    def arithmetic(self, ext: int, dst, src) -> bytes:
+        size = self.size_of(dst, src)
+        w = int(size == 64)
+        if isinstance(src, Immediate):
+            if size == 8:
+                return self.modrm(b'\x80', ext, dst, 0, True) + bytes([src.value & 0xFF])
+            if not src.symbolic and fits(src.value, 8):
+                return self.modrm(b'\x83', ext, dst, w) + struct.pack('<b', src.value)
+            if not src.symbolic and not fits(src.value, 32):
+                self.error('immediate does not fit into 32 bits')
+            return self.modrm(b'\x81', ext, dst, w) + struct.pack('<i', src.value)
+        if isinstance(src, Register):
+            opcode = (ext << 3) | (0x00 if size == 8 else 0x01)
+            return self.modrm(bytes([opcode]), src.number, dst, w, size == 8)
+        if isinstance(dst, Register) and isinstance(src, Memory):
+            opcode = (ext << 3) | (0x02 if size == 8 else 0x03)
+            return self.modrm(bytes([opcode]), dst.number, src, w, size == 8)
+        self.error('invalid operands')
+
+    def imul(self, ops) -> bytes:
+        if len(ops) == 1:
+            return self.modrm(b'\xf7', 5, ops[0], int(self.size_of(ops[0]) == 64))
+        dst = ops[0]
+        if not isinstance(dst, Register) or dst.size == 8:
+            self.error('invalid imul')
+        w = int(dst.size == 64)
+        if len(ops) == 2 and not isinstance(ops[1], Immediate):
+            return self.modrm(b'\x0f\xaf', dst.number, ops[1], w)
+        src, imm = (dst, ops[1]) if len(ops) == 2 else (ops[1], ops[2])
+        if not isinstance(imm, Immediate):
+            self.error('invalid imul')
+        if not imm.symbolic and fits(imm.value, 8):
+            return self.modrm(b'\x6b', dst.number, src, w) + struct.pack('<b', imm.value)
+        if not imm.symbolic and not fits(imm.value, 32):
+            self.error('immediate does not fit into 32 bits')
+        return self.modrm(b'\x69', dst.number, src, w) + struct.pack('<i', imm.value)
+
+    def data(self, mnemonic: str, operands: List[str], final: bool) -> bytes:
+        width = {'db': 1, 'dw': 2, 'dd': 4, 'dq': 8}[mnemonic]
+        out = b''
+        for operand in operands:
+            if operand[0] in '"\'`' and operand[-1] == operand[0] and len(operand) >= 2:
+                out += operand[1:-1].encode()
+                # strings are padded to whole units
+                if len(out) % width:
+                    out += bytes(width - len(out) % width)
+            else:
+                value, _ = self.expression(operand, final)
+                out += (value & ((1 << (8 * width)) - 1)).to_bytes(width, 'little')
+        return out
+
+    # --- layout ------------------
+
+    def layout(self, addresses: Dict[str, int], final: bool) -> Tuple[Dict[str, bytearray], Dict[str, int], Dict[str, int]]:
+        '''encodes every section, returns their contents, bss sizes and the label offsets'''
+        contents = {'.text': bytearray(), '.data': bytearray()}
+        bss = {'.bss': 0}
+        offsets: Dict[str, Tuple[str, int]] = {}
+        for section, number, label, mnemonic, operands in self.lines:
+            self.line_number = number
+            if section not in contents and section not in bss:
+                self.error(f'unknown section {section}')
+            if section == '.bss':
+                if label is not None:
+                    offsets[label] = (section, bss[section])
+                if mnemonic in ('resb', 'resq'):
+                    count, _ = self.expression(operands[0], True)
+                    bss[section] += count * (1 if mnemonic == 'resb' else 8)
+                elif mnemonic is not None:
+                    self.error(f'{mnemonic} in .bss')
+                continue
+
+            out = contents[section]
+            if label is not None:
+                offsets[label] = (section, len(out))
+            if mnemonic is None:
+                continue
+            if mnemonic in ('db', 'dw', 'dd', 'dq'):
+                out += self.data(mnemonic, operands, final)
+            else:
+                out += self.encode(mnemonic, operands, addresses[section] + len(out), final)
+        return contents, bss, offsets
+
+    def assemble(self) -> bytes:
+        '''returns the image of a static executable that starts at _start'''
+        text_address = BASE + ELF_HEADER + 2 * PROGRAM_HEADER
+        addresses = {'.text': text_address, '.data': 0, '.bss': 0}
+
+        # the first pass finds the size of every section and the offsets of the labels
+        contents, bss, offsets = self.layout(addresses, False)
+        text_size = len(contents['.text'])
+        data_offset = ELF_HEADER + 2 * PROGRAM_HEADER + text_size
+        # the data segment starts on a fresh page at the same offset within the page as in the file
+        data_address = (text_address + text_size + PAGE - 1) // PAGE * PAGE + data_offset % PAGE
+        addresses['.data'] = data_address
+        addresses['.bss'] = data_address + (len(contents['.data']) + 7) // 8 * 8
+        self.symbols = {label: addresses[section] + offset for label, (section, offset) in offsets.items()}
+
+        contents, bss, offsets = self.layout(addresses, True)
+        if len(contents['.text']) != text_size:
+            self.error('instruction sizes changed between passes')
+        if '_start' not in self.symbols:
+            self.error('no _start label')
+
+        data = bytes(contents['.data'])
+        data_size = addresses['.bss'] - data_address + bss['.bss']
+        header = struct.pack('<16sHHIQQQIHHHHHH', b'\x7fELF\x02\x01\x01', 2, 0x3E, 1, self.symbols['_start'],
+                             ELF_HEADER, 0, 0, ELF_HEADER, PROGRAM_HEADER, 2, 64, 0, 0)
+        # text: read and execute, data and bss: read and write
+        header += struct.pack('<IIQQQQQQ', 1, 5, 0, BASE, BASE, data_offset, data_offset, PAGE)
+        header += struct.pack('<IIQQQQQQ', 1, 6, data_offset, data_address, data_address, len(data), data_size, PAGE)
+        return header + bytes(contents['.text']) + data
+
+
+def assemble_file(path: str, output: str):
+    '''assembles the nasm file at path into the executable output'''
+    with open(path, 'r') as f:
+        image = Assembler(f.read(), path).assemble()
+    with open(output, 'wb') as f:
+        f.write(image)
+    os.chmod(output, 0o755)
@@ -0,0 +1,242 @@
+from typing import Dict, List
+from src.error import Error, NotDefinedError, NotEnoughOperantsError
+from src.lexer import Token
+from src.nodes import *
+from src.prog import Program
+from src.stack import wrap
+
+# opcodes are plain ints so the vm can compare them without enum overhead
+OP_HALT = 0
+OP_PUSH = 1         # operand: value
+OP_ADD = 2
+OP_SUB = 3
+OP_MUL = 4
+OP_DIV = 5
+OP_MOD = 6
+OP_PRINT = 7
+OP_DUP = 8
+OP_SWAP = 9
+OP_DROP = 10
+OP_EMIT = 11
+OP_EQ = 12
+OP_LT = 13
+OP_GT = 14
+OP_AND = 15
+OP_OR = 16
+OP_INVERT = 17
+OP_STRING = 18      # operands: index into the string pool, length
+OP_PUTS = 19
+OP_DEBUG_STACK = 20
+OP_DEBUG_DICT = 21
+OP_CALL = 22        # operand: address
+OP_RET = 23
+OP_JMP = 24         # operand: address
+OP_BRANCH = 25      # operand: address of the else part
+OP_DO = 26          # operand: address after the loop
+OP_LOOP = 27        # operand: address of the loop body
+OP_I = 28
+OP_FAIL = 29        # operand: index into consts (an Error to raise)
+OP_J = 30
+OP_K = 31
+
+# number of operands following each opcode
+OPERANDS = [0] * 32
+for op in (OP_PUSH, OP_CALL, OP_JMP, OP_BRANCH, OP_DO, OP_LOOP, OP_FAIL):
+    OPERANDS[op] = 1
+OPERANDS[OP_STRING] = 2
+
+# number of stack items each opcode needs, used for error reporting
+ARITY = [0] * 32
+for op in (OP_PRINT, OP_DUP, OP_DROP, OP_EMIT, OP_INVERT, OP_BRANCH):
+    ARITY[op] = 1
+for op in (OP_ADD, OP_SUB, OP_MUL, OP_DIV, OP_MOD, OP_SWAP, OP_EQ, OP_LT, OP_GT,
+           OP_AND, OP_OR, OP_PUTS, OP_DO):
+    ARITY[op] = 2
+
+NAMES = {v: k[3:] for k, v in list(globals().items()) if k.startswith('OP_')}
+
+# nodes that lower to a single opcode without operands
+SIMPLE = {
+    NodeAdd: OP_ADD,
+    NodeSubtract: OP_SUB,
+    NodeMultiply: OP_MUL,
+    NodeDivide: OP_DIV,
+    NodeMod: OP_MOD,
+    NodePrint: OP_PRINT,
+    NodeDupilcate: OP_DUP,
+    NodeSwap: OP_SWAP,
+    NodeDrop: OP_DROP,
+    NodeEmit: OP_EMIT,
+    NodeEquals: OP_EQ,
+    NodeLessThan: OP_LT,
+    NodeGreaterThan: OP_GT,
+    NodeAnd: OP_AND,
+    NodeOr: OP_OR,
+    NodeInvert: OP_INVERT,
+    NodePuts: OP_PUTS,
+    NodeDebugStack: OP_DEBUG_STACK,
+    NodeDebugDict: OP_DEBUG_DICT,
+}
+
+# counters of the running loop and the loops around it
+COUNTERS = {'i': OP_I, 'j': OP_J, 'k': OP_K}
+
+
+class Code():
+    def __init__(self) -> None:
+        self.ops: List[int] = []
+        # token of the node that emitted the opcode at the same position (None for operands)
+        self.tokens: List[Token] = []
+        self.consts: List = []
+
+    def emit(self, token: Token, op: int, *operands: int) -> int:
+        address = len(self.ops)
+        self.ops.append(op)
+        self.tokens.append(token)
+        for operand in operands:
+            self.ops.append(operand)
+            self.tokens.append(None)
+        return address
+
+    def patch(self, address: int, target: int):
+        self.ops[address + 1] = target
+
+    def const(self, value) -> int:
+        self.consts.append(value)
+        return len(self.consts) - 1
+
+    def __len__(self):
+        return len(self.ops)
+
+    def __str__(self) -> str:
+        s = ''
+        pc = 0
+        while pc < len(self.ops):
+            op = self.ops[pc]
+            operands = self.ops[pc + 1:pc + 1 + OPERANDS[op]]
+            s += f'{pc:6} {NAMES[op]:12} {" ".join(str(o) for o in operands)}\n'
+            pc += 1 + OPERANDS[op]
+        return s
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+class Compiler():
+    '''lowers the nodes of a parsed program into a flat Code object'''
+
+    def __init__(self, prog: Program) -> None:
+        self.prog = prog
+        self.code = Code()
+        self.dict: Dict[str, Node] = {}
+        # definition node -> address of its compiled body
+        self.addresses: Dict[int, int] = {}
+        # (definition node, address of the CALL to patch)
+        self.pending: List = []
+        # name -> addresses of FAILs inside word bodies waiting for a later definition
+        self.unresolved: Dict[str, List[int]] = {}
+        self.in_body = False
+        # end of the last compiled statement, see release
+        self.statement_end = 0
+        self.statement_consts = 0
+
+    def compile_statement(self, node: Node) -> int:
+        '''appends a single top level node followed by HALT, returns its address'''
+        code = self.code
+        start = len(code)
+        self.statement_consts = len(code.consts)
+        self.compile_node(node, False)
+        code.emit(None, OP_HALT)
+        self.statement_end = len(code)
+        self.compile_pending()
+        return start
+
+    def release(self, start: int):
+        '''drops the code of an executed statement unless word bodies were placed after it'''
+        code = self.code
+        if len(code) == self.statement_end:
+            del code.ops[start:]
+            del code.tokens[start:]
+            del code.consts[self.statement_consts:]
+
+    def compile_pending(self):
+        # word bodies are compiled once after the main program and invoked by CALL
+        self.in_body = True
+        while self.pending:
+            node, call = self.pending.pop()
+            if id(node) not in self.addresses:
+                self.addresses[id(node)] = len(self.code)
+                self.compile_definition(node)
+            self.code.patch(call, self.addresses[id(node)])
+        self.in_body = False
+
+    def compile_nodes(self, nodes: List[Node], in_loop: bool):
+        for node in nodes:
+            self.compile_node(node, in_loop)
+
+    def compile_node(self, node: Node, in_loop: bool):
+        code = self.code
+        op = SIMPLE.get(type(node))
+        if op is not None:
+            code.emit(node.token, op)
+        elif isinstance(node, NodeNumber):
+            code.emit(node.token, OP_PUSH, wrap(int(node.token.value)))
+        elif isinstance(node, (NodeString, NodeCarriageReturn)):
+            code.emit(node.token, OP_STRING, node.index, node.length)
+        elif isinstance(node, (NodeWord, NodeIf, NodeLoop)):
+            # definitions produce no code, calls are resolved against them
+            if node.name in self.dict:
+                # like the tree engine, calls made from now on see the new definition, also
+                # inside words compiled before. their bodies are compiled again when called
+                self.addresses.clear()
+            self.dict[node.name] = node
+            for address in self.unresolved.pop(node.name, []):
+                code.ops[address] = OP_CALL
+                self.pending.append((node, address))
+        elif isinstance(node, NodeCallIf):
+            self.compile_call(node)
+        elif isinstance(node, NodeCall):
+            if in_loop and node.name in COUNTERS:
+                code.emit(node.token, COUNTERS[node.name])
+            else:
+                self.compile_call(node)
+        else:
+            raise Error(node.token.file_name, node.token.line_number)
+
+    def compile_call(self, node: Node):
+        code = self.code
+        definition = self.dict.get(node.name)
+        if definition is None:
+            # undefined words only fail once they are actually reached
+            error = NotDefinedError(node.token.file_name, node.token.line_number, node.name)
+            address = code.emit(node.token, OP_FAIL, code.const(error))
+            if self.in_body:
+                self.unresolved.setdefault(node.name, []).append(address)
+            return
+        if isinstance(definition, NodeIf) and definition.condition == []:
+            error = NotEnoughOperantsError(node.token.file_name, node.token.line_number, -1)
+            code.emit(node.token, OP_FAIL, code.const(error))
+            return
+        call = code.emit(node.token, OP_CALL, -1)
+        self.pending.append((definition, call))
+
+    def compile_definition(self, node: Node):
+        code = self.code
+        if isinstance(node, NodeWord):
+            self.compile_nodes(node.content, False)
+        elif isinstance(node, NodeIf):
+            self.compile_nodes(node.condition, False)
+            branch = code.emit(node.token, OP_BRANCH, -1)
+            self.compile_nodes(node.content, False)
+            jump = code.emit(node.token, OP_JMP, -1)
+            code.patch(branch, len(code))
+            self.compile_nodes(node.else_part, False)
+            code.patch(jump, len(code))
+        elif isinstance(node, NodeLoop):
+            self.compile_nodes(node.content, False)
+            do = code.emit(node.token, OP_DO, -1)
+            body = len(code)
+            self.compile_nodes(node.body, True)
+            code.emit(node.token, OP_LOOP, body)
+            code.patch(do, len(code))
+        code.emit(node.token, OP_RET)
@@ -0,0 +1,106 @@
+import hashlib
+import os
+import shutil
+from typing import List, Optional
+
+# default location of the build cache, STACKY_CACHE_DIR overrides it
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'stacky')
+CACHE_SIZE = 256 << 20
+
+# files that make up the compiler, a change to any of them invalidates the cache
+COMPILER_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_compiler_hash = None
+
+
+def compiler_hash() -> str:
+    '''hash of the compiler sources, stands in for a version number'''
+    global _compiler_hash
+    if _compiler_hash is None:
+        h = hashlib.sha256()
+        files = [os.path.join(COMPILER_ROOT, 'main.py')]
+        src = os.path.join(COMPILER_ROOT, 'src')
+        files += [os.path.join(src, name) for name in sorted(os.listdir(src)) if name.endswith('.py')]
+        for path in files:
+            h.update(os.path.basename(path).encode())
+            with open(path, 'rb') as f:
+                h.update(f.read())
+        _compiler_hash = h.hexdigest()
+    return _compiler_hash
+
+
+def artifacts(base: str) -> List[str]:
+    '''files com produces for a program: assembly, binary and the object file (nasm only)'''
+    return [base + '.asm', base, base + '.o']
+
+
+class BuildCache():
+    '''content addressed store of compiled programs with least recently used eviction
+
+    every entry is a directory named after the key that holds the artifacts of one
+    build, its modification time is the time it was last used.
+    '''
+
+    def __init__(self, path: Optional[str] = None, size: int = CACHE_SIZE) -> None:
+        self.path = path or os.environ.get('STACKY_CACHE_DIR') or CACHE_DIR
+        self.size = size
+
+    def key(self, source: str, flags: List[str]) -> str:
+        h = hashlib.sha256()
+        h.update(compiler_hash().encode())
+        h.update(' '.join(flags).encode())
+        with open(source, 'rb') as f:
+            h.update(f.read())
+        return h.hexdigest()
+
+    def restore(self, key: str, base: str) -> bool:
+        '''copies the artifacts of an earlier build next to the source, False if there are none'''
+        entry = os.path.join(self.path, key)
+        names = [os.path.basename(a) for a in artifacts('out')]
+        if not all(os.path.isfile(os.path.join(entry, name)) for name in names[:2]):
+            return False
+        for name, target in zip(names, artifacts(base)):
+            if os.path.isfile(os.path.join(entry, name)):
+                shutil.copyfile(os.path.join(entry, name), target)
+                shutil.copymode(os.path.join(entry, name), target)
+        os.utime(entry)
+        return True
+
+    def store(self, key: str, base: str, since: float):
+        '''adds the artifacts of a build that started at since, incomplete builds are not cached'''
+        # a failed nasm or ld leaves the files of an older build behind
+        fresh = [os.path.isfile(a) and os.path.getmtime(a) >= int(since) for a in artifacts(base)]
+        if not all(fresh[:2]):
+            return
+        os.makedirs(self.path, exist_ok=True)
+        entry = os.path.join(self.path, key)
+        # entries appear atomically, parallel builds of the same program are fine
+        tmp = f'{entry}.{os.getpid()}.tmp'
+        os.makedirs(tmp, exist_ok=True)
+        for source, name, new in zip(artifacts(base), artifacts('out'), fresh):
+            if new:
+                shutil.copy2(source, os.path.join(tmp, name))
+        try:
+            os.rename(tmp, entry)
+        except OSError:
+            # someone else stored the same build first
+            shutil.rmtree(tmp, ignore_errors=True)
+        self.evict()
+
+    def evict(self):
+        '''removes the least recently used entries until the cache fits its size'''
+        entries = []
+        total = 0
+        for name in os.listdir(self.path):
+            entry = os.path.join(self.path, name)
+            if name.endswith('.tmp') or not os.path.isdir(entry):
+                continue
+            size = sum(os.path.getsize(os.path.join(entry, f)) for f in os.listdir(entry))
+            entries.append((os.path.getmtime(entry), size, entry))
+            total += size
+        entries.sort()
+        for _, size, entry in entries:
+            if total <= self.size:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
@@ -0,0 +1,682 @@
+import os
+import subprocess
+import sys
+from typing import List, Optional
+from src.assembler import assemble_file
+from src.error import AssemblerError, NotCompilableError, NotDefinedError, NotEnoughOperantsError
+from src.lexer import KEYWORDS, Token
+from src.nodes import *
+from src.peephole import Peephole
+from src.prog import Program
+
+# x86 64 backend of com, sim never imports it
+
+# return addresses of nested word calls in compiled programs
+RETURN_STACK_SIZE = 1 << 16
+# counter and end of loops nested deeper than two in compiled programs
+LOOP_STACK_SIZE = 1 << 12
+
+# written by compiled programs whose words or loops nest deeper than their stack allows
+RETURN_STACK_OVERFLOW = f'Return Stack Overflow (Capacity {RETURN_STACK_SIZE})\n'
+LOOP_STACK_OVERFLOW = f'Loop Stack Overflow (Capacity {LOOP_STACK_SIZE})\n'
+
+# runtime routines and the start of the program, the same for every program
+PRELUDE = (
+    "BITS 64\n"
+    "section .text\n"
+    "print:\n"
+    "    mov r9, -3689348814741910323\n"
+    "    sub rsp, 40\n"
+    "    mov BYTE [rsp+31], 10\n"
+    "    lea rcx, [rsp+30]\n"
+    ".L2:\n"
+    "    mov rax, rdi\n"
+    "    lea r8, [rsp+32]\n"
+    "    mul r9\n"
+    "    mov rax, rdi\n"
+    "    sub r8, rcx\n"
+    "    shr rdx, 3\n"
+    "    lea rsi, [rdx+rdx*4]\n"
+    "    add rsi, rsi\n"
+    "    sub rax, rsi\n"
+    "    add eax, 48\n"
+    "    mov BYTE [rcx], al\n"
+    "    mov rax, rdi\n"
+    "    mov rdi, rdx\n"
+    "    mov rdx, rcx\n"
+    "    sub rcx, 1\n"
+    "    cmp rax, 9\n"
+    "    ja  .L2\n"
+    "    lea rax, [rsp+32]\n"
+    "    mov edi, 1\n"
+    "    sub rdx, rax\n"
+    "    xor eax, eax\n"
+    "    lea rsi, [rsp+32+rdx]\n"
+    "    mov rdx, r8\n"
+    "    mov rax, 1\n"
+    "    syscall\n"
+    "    add rsp, 40\n"
+    "    ret\n"
+    "puts:\n"
+    "    mov rax, 0x1\n"
+    "    mov rdi, 0x1\n"
+    # rsi holds the string address, rdx its length
+    "    syscall\n"
+    "    ret\n"
+    "return_stack_overflow:\n"
+    "    mov rsi, return_stack_overflow_message\n"
+    f"    mov rdx, {len(RETURN_STACK_OVERFLOW)}\n"
+    "    jmp overflow\n"
+    "loop_stack_overflow:\n"
+    "    mov rsi, loop_stack_overflow_message\n"
+    f"    mov rdx, {len(LOOP_STACK_OVERFLOW)}\n"
+    "overflow:\n"
+    # writes the message to stderr and exits with status 1
+    "    mov rax, 1\n"
+    "    mov rdi, 2\n"
+    "    syscall\n"
+    "    mov rax, 60\n"
+    "    mov rdi, 1\n"
+    "    syscall\n"
+    "global _start\n"
+    "_start:\n"
+    # the return addresses of called words and the state of outer loops live on their own stacks
+    "    mov rbp, return_stack\n"
+    "    mov rbx, loop_stack\n"
+)
+
+EXIT = [
+    '; --- exit ---\n',
+    '    mov rax, 60\n',
+    '    mov rdi, 0\n',
+    '    syscall\n',
+]
+
+# where compiled code finds the counters, see compile_loop_body
+LOOP_COUNTERS = {'i': 'r12', 'j': 'r14', 'k': '[rbx-16]'}
+
+# writes rdi and a newline to the file descriptor in counters_fd, used by instrumented programs
+WRITE_COUNT = [
+    'write_count:\n',
+    '    sub rsp, 40\n',
+    '    mov BYTE [rsp+31], 10\n',
+    '    lea rsi, [rsp+31]\n',
+    '    mov rax, rdi\n',
+    '    mov rcx, 10\n',
+    '.digit:\n',
+    '    xor rdx, rdx\n',
+    '    div rcx\n',
+    '    add rdx, 48\n',
+    '    sub rsi, 1\n',
+    '    mov BYTE [rsi], dl\n',
+    '    test rax, rax\n',
+    '    jne .digit\n',
+    '    lea rdx, [rsp+32]\n',
+    '    sub rdx, rsi\n',
+    '    mov rdi, [counters_fd]\n',
+    '    mov rax, 1\n',
+    '    syscall\n',
+    '    add rsp, 40\n',
+    '    ret\n',
+]
+
+# words that expand to at most this many nodes are inlined, inside loop bodies
+# the call runs on every iteration so larger words are inlined as well
+INLINE_SIZE = 8
+INLINE_HOT = 24
+
+
+# --- nodes ---
+
+def compile_number(prog: Program, node: NodeNumber):
+    prog.emit(f';--- push {node.token.value} to stack ---\n')
+    reg = prog.free()
+    prog.emit(f'    mov {reg}, {node.token.value}\n')
+    prog.put(reg)
+
+
+def compile_add(prog: Program, node: NodeAdd):
+    prog.emit(f';--- add two numbers ---\n')
+    b, a = prog.take(2)
+    prog.emit(f'    add {b}, {a}\n')
+    prog.put(b)
+
+
+def compile_subtract(prog: Program, node: NodeSubtract):
+    prog.emit(f';--- subtract two numbers ---\n')
+    b, a = prog.take(2)
+    prog.emit(f'    sub {b}, {a}\n')
+    prog.put(b)
+
+
+def compile_print(prog: Program, node: NodePrint):
+    prog.emit(f';--- print number ---\n')
+    (a,) = prog.take(1)
+    prog.spill()
+    prog.emit(f'    mov rdi, {a}\n')
+    prog.emit(f'    call print\n')
+
+
+def compile_multiply(prog: Program, node: NodeMultiply):
+    prog.emit(f';--- multiplies two numbers ---\n')
+    b, a = prog.take(2)
+    prog.emit(f'    imul {b}, {a}\n')
+    prog.put(b)
+
+
+def compile_divide(prog: Program, node: NodeDivide):
+    prog.emit(f';--- divides two numbers ---\n')
+    b, a = prog.take(2)
+    prog.emit(f'    mov rax, {b}\n')
+    prog.emit(f'    cqo\n')
+    prog.emit(f'    idiv {a}\n')
+    prog.emit(f'    mov {b}, rax\n')
+    prog.put(b)
+
+
+def compile_duplicate(prog: Program, node: NodeDupilcate):
+    prog.emit(f';--- dupilicates a number ---\n')
+    (a,) = prog.take(1)
+    prog.put(a)
+    reg = prog.free()
+    prog.emit(f'    mov {reg}, {a}\n')
+    prog.put(reg)
+
+
+def compile_swap(prog: Program, node: NodeSwap):
+    prog.emit(f';--- swapes two numbers ---\n')
+    b, a = prog.take(2)
+    prog.put(a)
+    prog.put(b)
+
+
+def compile_drop(prog: Program, node: NodeDrop):
+    prog.emit(f';--- drops the first number ---\n')
+    (a,) = prog.take(1)
+
+
+def compile_equals(prog: Program, node: NodeEquals):
+    prog.emit(f';--- checks for equality of two numbers ---\n')
+    b, a = prog.take(2)
+    prog.emit(f'    mov rcx, 0\n')  # false
+    prog.emit(f'    mov rdx, 1\n')  # true
+    prog.emit(f'    cmp {a}, {b}\n')
+    prog.emit(f'    cmove rcx, rdx\n')  # move if zero (equal)
+    prog.emit(f'    mov {b}, rcx\n')
+    prog.put(b)
+
+
+def compile_definition(prog: Program, node: Node):
+    '''word, if and loop definitions, calls compiled from now on are compiled against node'''
+    if node.name in prog.defined:
+        # like the simulator, a redefinition also reaches the words calling it. their
+        # subroutines and inlined bodies were compiled against the old definition, the
+        # next call compiles them again
+        prog.words = {}
+    prog.defined.add(node.name)
+    prog.dict[node.name] = node
+
+
+def compile_string(prog: Program, node: NodeString):
+    # the string itself is written once to .data, see string_data
+    prog.emit(f';---- string ----\n')
+    reg = prog.free()
+    prog.emit(f'    mov {reg}, string_{node.index}\n')  # address
+    prog.put(reg)
+    reg = prog.free()
+    prog.emit(f'    mov {reg}, {node.length}\n')
+    prog.put(reg)
+
+
+def compile_puts(prog: Program, node: NodePuts):
+    prog.emit(f';--- prints string ---\n')
+    b, a = prog.take(2)
+    prog.spill()
+    prog.emit(f'    mov rdx, {a}\n')  # length
+    prog.emit(f'    mov rsi, {b}\n')  # address / label
+    prog.emit(f'    call puts\n')
+
+
+def compile_less_than(prog: Program, node: NodeLessThan):
+    prog.emit(f';--- checks if the second number is less than the first ---\n')
+    b, a = prog.take(2)
+    prog.emit(f'    mov rcx, 0\n')  # false
+    prog.emit(f'    mov rdx, 1\n')  # true
+    prog.emit(f'    cmp {a}, {b}\n')
+    prog.emit(f'    cmovg rcx, rdx\n')  # move if greater than (the opposite)
+    prog.emit(f'    mov {b}, rcx\n')
+    prog.put(b)
+
+
+def compile_greater_than(prog: Program, node: NodeGreaterThan):
+    prog.emit(f';--- checks if the second number is greater than the first ---\n')
+    b, a = prog.take(2)
+    prog.emit(f'    mov rcx, 0\n')  # false
+    prog.emit(f'    mov rdx, 1\n')  # true
+    prog.emit(f'    cmp {a}, {b}\n')
+    prog.emit(f'    cmovl rcx, rdx\n')  # move if less than
+    prog.emit(f'    mov {b}, rcx\n')
+    prog.put(b)
+
+
+def compile_and(prog: Program, node: NodeAnd):
+    # compare and jump to false if false
+    # if not jumped set 1 and jump to end
+    prog.emit(f';---- and ----\n')
+    b, a = prog.take(2)
+    prog.emit(f'    cmp {a}, 1\n')
+    false = prog.get_label()
+    prog.emit(f'    jne {false}\n')
+    prog.emit(f'    cmp {b}, 1\n')
+    prog.emit(f'    jne {false}\n')
+    prog.emit(f'    mov {b}, 1\n')         # true
+    end = prog.get_label()
+    prog.emit(f'    jmp {end}\n')
+    prog.emit(f'{false}:\n')
+    prog.emit(f'    mov {b}, 0\n')         # false
+    prog.emit(f'{end}:\n')
+    prog.emit(f'    nop\n')
+    prog.put(b)
+
+
+def compile_or(prog: Program, node: NodeOr):
+    prog.emit(f';---- or ----\n')
+    b, a = prog.take(2)
+    true = prog.get_label()
+    end = prog.get_label()
+    prog.emit(f'    cmp {a}, 1\n')
+    prog.emit(f'    je {true}\n')
+    prog.emit(f'    cmp {b}, 1\n')
+    prog.emit(f'    je {true}\n')
+    prog.emit(f'    mov {b}, 0\n')
+    prog.emit(f'    jmp {end}\n')
+    prog.emit(f'{true}:\n')
+    prog.emit(f'    mov {b}, 1\n')
+    prog.emit(f'{end}:\n')
+    prog.emit(f'    nop\n')
+    prog.put(b)
+
+
+def compile_invert(prog: Program, node: NodeInvert):
+    prog.emit(f';---- invert ----\n')
+    (a,) = prog.take(1)
+    prog.emit(f'    mov rcx, 0\n')
+    prog.emit(f'    mov rdx, 1\n')
+    prog.emit(f'    cmp {a}, 0\n')
+    prog.emit(f'    cmove rcx, rdx\n')  # 1 if zero
+    prog.emit(f'    mov {a}, rcx\n')
+    prog.put(a)
+
+
+def compile_mod(prog: Program, node: NodeMod):
+    prog.emit(f';---- mod ----\n')
+    b, a = prog.take(2)
+    prog.emit(f'    xor rdx, rdx\n')
+    prog.emit(f'    mov rax, {b}\n')    # divide rax by a
+    prog.emit(f'    div {a}\n')
+    # remainder stored in rdx
+    prog.emit(f'    mov {b}, rdx\n')
+    prog.put(b)
+
+
+def compile_call_node(prog: Program, node: Node):
+    compile_call(prog, node.token, node.name)
+
+
+# emit, STACK and DICT can not be compiled yet
+COMPILERS = {
+    NodeNumber: compile_number,
+    NodeAdd: compile_add,
+    NodeSubtract: compile_subtract,
+    NodePrint: compile_print,
+    NodeMultiply: compile_multiply,
+    NodeDivide: compile_divide,
+    NodeDupilcate: compile_duplicate,
+    NodeSwap: compile_swap,
+    NodeDrop: compile_drop,
+    NodeEquals: compile_equals,
+    NodeCall: compile_call_node,
+    NodeWord: compile_definition,
+    NodeString: compile_string,
+    NodePuts: compile_puts,
+    NodeCarriageReturn: compile_string,
+    NodeLessThan: compile_less_than,
+    NodeGreaterThan: compile_greater_than,
+    NodeAnd: compile_and,
+    NodeOr: compile_or,
+    NodeInvert: compile_invert,
+    NodeMod: compile_mod,
+    NodeIf: compile_definition,
+    NodeCallIf: compile_call_node,
+    NodeLoop: compile_definition,
+}
+
+
+def compile_node(prog: Program, node: Node):
+    '''emits the x86 64 assembly for node into prog'''
+    compiler = COMPILERS.get(type(node))
+    if compiler is None:
+        token = node.token
+        name = next((k for k, v in KEYWORDS.items() if v == token.tokenType), type(node).__name__)
+        raise NotCompilableError(token.file_name, token.line_number, name)
+    compiler(prog, node)
+
+
+def compile_nodes(prog: Program, nodes: List[Node]):
+    for el in nodes:
+        compile_node(prog, el)
+
+
+# --- definitions ---
+
+def count(prog: Program, kind: str, definition: Node):
+    '''increments the counter of kind (word, loop, then or else) of definition in instrumented code'''
+    if prog.counters is None:
+        return
+    key = (kind, id(definition))
+    index = prog.counter_ids.get(key)
+    if index is None:
+        index = prog.counter_ids[key] = len(prog.counters)
+        prog.counters.append((kind, definition))
+    prog.emit(f'    inc QWORD [counters+{8 * index}]\n')
+
+
+def compile_if_body(prog: Program, node: NodeIf):
+    prog.emit(f';---- if node ----\n')
+    compile_nodes(prog, node.condition)
+
+    # both branches start and end with an empty register cache
+    (a,) = prog.take(1)
+    prog.spill()
+    prog.emit(f'    cmp {a}, 1\n')  # true
+    else_part = prog.get_label()
+    prog.emit(f'    jne {else_part}\n')
+
+    end = prog.get_label()
+    # true part
+    count(prog, 'then', node)
+    compile_nodes(prog, node.content)
+    prog.spill()
+    prog.emit(f'    jmp {end}\n')
+
+    # else part
+    prog.emit(f'{else_part}:\n')
+    count(prog, 'else', node)
+    compile_nodes(prog, node.else_part)
+    prog.spill()
+
+    prog.emit(f'{end}:\n')
+    prog.emit(f'    nop\n')
+
+
+def compile_loop_body(prog: Program, node: NodeLoop):
+    # the running loop keeps counter and end in r12 and r13, the loop around it in r14 and r15,
+    # all further loops are saved on the loop stack that rbx points to
+    loop_body_start = prog.get_label()
+    loop_end = prog.get_label()
+    prog.emit(f'; loop start\n')
+    compile_nodes(prog, node.content)
+
+    # get from to numbers
+    b, a = prog.take(2)
+    prog.spill()
+    prog.emit(f'    cmp rbx, loop_stack+{16 * LOOP_STACK_SIZE}\n')
+    prog.emit(f'    jae loop_stack_overflow\n')
+    prog.emit(f'    mov [rbx], r14\n')
+    prog.emit(f'    mov [rbx+8], r15\n')
+    prog.emit(f'    add rbx, 16\n')
+    prog.emit(f'    mov r14, r12\n')
+    prog.emit(f'    mov r15, r13\n')
+    prog.emit(f'    mov r12, {a}\n')  # counter
+    prog.emit(f'    mov r13, {b}\n')  # end
+    prog.emit(f'    cmp r12, r13\n')
+    prog.emit(f'    jge {loop_end}\n')
+
+    # body begin
+    prog.emit(f'; loop body begin\n')
+    prog.emit(f'{loop_body_start}:\n')
+    count(prog, 'loop', node)
+    prog.loop_depth += 1
+    for el in node.body:
+        if isinstance(el, NodeCall) and el.name in LOOP_COUNTERS:
+            reg = prog.free()
+            prog.emit(f'    mov {reg}, {LOOP_COUNTERS[el.name]}\n')
+            prog.put(reg)
+        else:
+            compile_node(prog, el)
+    prog.loop_depth -= 1
+    prog.spill()
+
+    # count up and check the loop condition
+    prog.emit(f'    inc r12\n')
+    prog.emit(f'    cmp r12, r13\n')
+    prog.emit(f'    jl {loop_body_start}\n')
+
+    prog.emit(f';loop end\n')
+    prog.emit(f'{loop_end}:\n')
+    prog.emit(f'    mov r12, r14\n')
+    prog.emit(f'    mov r13, r15\n')
+    prog.emit(f'    sub rbx, 16\n')
+    prog.emit(f'    mov r14, [rbx]\n')
+    prog.emit(f'    mov r15, [rbx+8]\n')
+
+
+def compile_body(prog: Program, definition: Node):
+    '''emits the code a call of the word, if or loop definition runs'''
+    # inlined and called words are counted alike
+    count(prog, 'word', definition)
+    if isinstance(definition, NodeIf):
+        compile_if_body(prog, definition)
+    elif isinstance(definition, NodeLoop):
+        compile_loop_body(prog, definition)
+    else:
+        compile_nodes(prog, definition.content)
+
+
+# --- words in compiled code ---
+
+def inline_size(prog: Program, definition: Node, limit: int, active=None):
+    '''number of nodes the definition expands to, None if it is recursive or larger than limit'''
+    if active is None:
+        active = set()
+    if id(definition) in active:
+        return None
+    if isinstance(definition, NodeIf):
+        nodes = definition.condition + definition.content + definition.else_part
+    elif isinstance(definition, NodeLoop):
+        nodes = definition.content + definition.body
+    else:
+        nodes = definition.content
+
+    active.add(id(definition))
+    size = 0
+    for el in nodes:
+        callee = prog.dict.get(el.name) if isinstance(el, (NodeCall, NodeCallIf)) else None
+        if isinstance(callee, (NodeWord, NodeIf, NodeLoop)):
+            n = inline_size(prog, callee, limit - size, active)
+            if n is None:
+                return None
+            size += n
+        else:
+            size += 1
+        if size > limit:
+            return None
+    active.discard(id(definition))
+    return size
+
+
+def compile_call(prog: Program, token: Token, name: str):
+    '''inlines small words, all others are compiled once and called'''
+    definition = prog.dict.get(name)
+    if not isinstance(definition, (NodeWord, NodeIf, NodeLoop)):
+        raise NotDefinedError(token.file_name, token.line_number, name)
+    if isinstance(definition, NodeIf) and definition.condition == []:
+        raise NotEnoughOperantsError(token.file_name, token.line_number, -1)
+
+    limit = INLINE_HOT if prog.loop_depth > 0 else INLINE_SIZE
+    if inline_size(prog, definition, limit) is not None:
+        compile_body(prog, definition)
+        return
+
+    prog.emit(f';--- call {name} ---\n')
+    prog.spill()
+    prog.emit(f'    call {prog.get_word_label(definition)}\n')
+
+
+def compile_pending(prog: Program) -> List[str]:
+    '''compiles the subroutines of the words called since the last time, returns their lines'''
+    # the code around the calls keeps its register cache and its output
+    cached, loop_depth, asm = prog.cached, prog.loop_depth, prog.asm
+    prog.asm = []
+    while prog.pending:
+        label, definition = prog.pending.pop()
+        prog.cached = []
+        prog.loop_depth = 0
+        prog.emit(f';---- word {definition.name} ----\n')
+        prog.emit(f'{label}:\n')
+        # the return address moves from the data stack to the return stack, unless it is full
+        prog.emit(f'    cmp rbp, return_stack+{8 * RETURN_STACK_SIZE}\n')
+        prog.emit(f'    jae return_stack_overflow\n')
+        prog.emit(f'    pop QWORD [rbp]\n')
+        prog.emit(f'    add rbp, 8\n')
+        compile_body(prog, definition)
+        prog.spill()
+        prog.emit(f'    sub rbp, 8\n')
+        prog.emit(f'    push QWORD [rbp]\n')
+        prog.emit(f'    ret\n')
+    words = prog.asm
+    prog.cached, prog.loop_depth, prog.asm = cached, loop_depth, asm
+    return words
+
+
+# --- programs ---
+
+def string_data(string: str) -> str:
+    '''operands of db for string, quotes and control characters are written as numbers'''
+    parts = []
+    run = ''
+    for char in string:
+        if char == '"' or ord(char) < 32:
+            if run:
+                parts.append(f'"{run}"')
+                run = ''
+            parts.append(str(ord(char)))
+        else:
+            run += char
+    if run:
+        parts.append(f'"{run}"')
+    return ', '.join(parts) or '0'
+
+
+def compile_counters(prog: Program, out: str) -> List[str]:
+    '''code that writes one "kind name count" line per counter to stderr ('-') or the file out'''
+    lines = [f'; --- counter table ---\n']
+    if out != '-':
+        lines += [
+            f'    mov rax, 2\n',  # open
+            f'    mov rdi, counters_path\n',
+            f'    mov rsi, 577\n',  # O_WRONLY | O_CREAT | O_TRUNC
+            f'    mov rdx, 420\n',  # 0644
+            f'    syscall\n',
+            # stderr if the file can not be opened
+            f'    mov rcx, 2\n',
+            f'    test rax, rax\n',
+            f'    cmovs rax, rcx\n',
+            f'    mov [counters_fd], rax\n',
+        ]
+    for i, (kind, definition) in enumerate(prog.counters):
+        lines += [
+            f'    mov rsi, counter_{i}\n',
+            f'    mov rdx, {len(counter_name(kind, definition).encode())}\n',
+            f'    mov rdi, [counters_fd]\n',
+            f'    mov rax, 1\n',
+            f'    syscall\n',
+            f'    mov rdi, [counters+{8 * i}]\n',
+            f'    call write_count\n',
+        ]
+    return lines
+
+
+def counter_name(kind: str, definition: Node) -> str:
+    return f'{kind} {definition.name} '
+
+
+def compile_program(prog: Program, statements, path: str, peephole: bool = True, stats: bool = False, backend: str = 'nasm',
+                    instrument: Optional[str] = None):
+    '''instrument is None or where the binary writes its counters at exit, '-' for stderr'''
+    filename = os.path.splitext(path)[0] + ".asm"
+    if instrument is not None:
+        prog.counters = []
+    with open(filename, 'w') as f:
+        f.write(PRELUDE)
+
+        # the generated code runs through the peephole optimizer on its way to the file
+        optimizer = Peephole() if peephole else None
+
+        def emit(lines: List[str]):
+            if optimizer:
+                f.write(optimizer.feed(lines))
+            else:
+                f.writelines(lines)
+
+        words = []
+        for node in statements:
+            compile_node(prog, node)
+            emit(prog.asm)
+            prog.asm = []
+            # called words are compiled against the definitions visible now
+            words.append(compile_pending(prog))
+
+        if instrument is not None:
+            emit(compile_counters(prog, instrument))
+        emit(EXIT)
+        # subroutines
+        for lines in words:
+            emit(lines)
+        if instrument is not None:
+            emit(WRITE_COUNT)
+        if optimizer:
+            f.write(optimizer.flush())
+            f.write(f'; {optimizer.report()}\n')
+            if stats:
+                print(optimizer.report(), file=sys.stderr)
+
+        # string content, one entry per distinct string of the program
+        f.write(f'section .data\n')
+        f.write(f';---- strings ----\n')
+        f.writelines(f'string_{i}: db {string_data(string)}\n' for i, string in enumerate(prog.strings))
+        f.write(f'return_stack_overflow_message: db {string_data(RETURN_STACK_OVERFLOW)}\n')
+        f.write(f'loop_stack_overflow_message: db {string_data(LOOP_STACK_OVERFLOW)}\n')
+        if instrument is not None:
+            f.write(f';---- counters ----\n')
+            f.write(f'counters_fd: dq 2\n')
+            if instrument != '-':
+                f.write(f'counters_path: db {string_data(instrument)}, 0\n')
+            f.writelines(f'counter_{i}: db {string_data(counter_name(kind, definition))}\n'
+                         for i, (kind, definition) in enumerate(prog.counters))
+
+        f.write(f'section .bss\n')
+        f.write(f'return_stack resq {RETURN_STACK_SIZE}\n')
+        f.write(f'loop_stack resq {2 * LOOP_STACK_SIZE}\n')
+        if instrument is not None:
+            f.write(f'counters resq {max(len(prog.counters), 1)}\n')
+
+    if backend == 'builtin':
+        # encodes the .asm file in process, nasm and ld remain the fallback
+        try:
+            assemble_file(filename, os.path.splitext(filename)[0])
+            return
+        except AssemblerError as error:
+            print(f'{error}, falling back to nasm', file=sys.stderr)
+    compile(filename)
+
+
+def compile(filename: str):
+    cmd = f'nasm -f elf64 {filename}'
+    subprocess.run(cmd.split(), check=True)
+    link(os.path.splitext(filename)[0] + ".o")
+
+
+def link(filename: str):
+    cmd = f'ld -s -o {os.path.splitext(filename)[0]} {filename}'
+    subprocess.run(cmd.split(), check=True)
@@ -48,3 +48,54 @@ class NotDefinedError(Error):
 
     def __repr__(self) -> str:
         return super().__repr__()
+
+
+class StackOverflowError(Error):
+    def __init__(self, fn, ln, capacity):
+        super().__init__(fn, ln)
+        self.capacity = capacity
+        self.message = f'Stack Overflow (Capacity {capacity})'
+
+    def __str__(self) -> str:
+        return super().__str__()
+
+    def __repr__(self) -> str:
+        return super().__repr__()
+
+
+class NoClosingQuotationError(Error):
+    def __init__(self, fn, ln):
+        super().__init__(fn, ln)
+        self.message = f'No Closing Quotation'
+
+    def __str__(self) -> str:
+        return super().__str__()
+
+    def __repr__(self) -> str:
+        return super().__repr__()
+
+
+class AssemblerError(Error):
+    def __init__(self, fn, ln, reason):
+        super().__init__(fn, ln)
+        self.reason = reason
+        self.message = f'Can not assemble - {reason}'
+
+    def __str__(self) -> str:
+        return super().__str__()
+
+    def __repr__(self) -> str:
+        return super().__repr__()
+
+
+class NotCompilableError(Error):
+    def __init__(self, fn, ln, name):
+        super().__init__(fn, ln)
+        self.name = name
+        self.message = f'Can not be compiled - {self.name}'
+
+    def __str__(self) -> str:
+        return super().__str__()
+
+    def __repr__(self) -> str:
+        return super().__repr__()
@@ -1,5 +1,7 @@
 from enum import Enum
-import shlex
+from typing import Dict, List
+import re
+from src.error import NoClosingQuotationError
 
 counter = 0
 
@@ -45,12 +47,49 @@ class TokenType(Enum):
     OP_CR = id()
 
 
+class Locations():
+    '''file names shared by all tokens, a location packs line and file index into one int'''
+
+    def __init__(self) -> None:
+        self.files: List[str] = []
+        self.ids: Dict[str, int] = {}
+
+    def file_index(self, file_name: str) -> int:
+        index = self.ids.get(file_name)
+        if index is None:
+            index = len(self.files)
+            self.files.append(file_name)
+            self.ids[file_name] = index
+        return index
+
+    def get(self, file_name: str, line_number: int) -> int:
+        return (line_number << 16) | self.file_index(file_name)
+
+    def file_name(self, location: int) -> str:
+        return self.files[location & 0xffff]
+
+    def line_number(self, location: int) -> int:
+        return location >> 16
+
+
+LOCATIONS = Locations()
+
+
 class Token():
-    def __init__(self, tokenType, value, file_name, line_number):
+    __slots__ = ('tokenType', 'value', 'location')
+
+    def __init__(self, tokenType, value, location: int):
         self.tokenType = tokenType
         self.value = value
-        self.line_number = line_number
-        self.file_name = file_name
+        self.location = location
+
+    @property
+    def file_name(self) -> str:
+        return LOCATIONS.files[self.location & 0xffff]
+
+    @property
+    def line_number(self) -> int:
+        return self.location >> 16
 
     def __str__(self) -> str:
         return f'{self.tokenType} : {self.value}'
@@ -59,177 +98,80 @@ class Token():
         return f'{self.tokenType} : {self.value}'
 
 
+# whitespace separated words, quoted strings stay one word (like shlex.split(posix=False))
+# a lone quote is only matched when its closing quote is missing
+SCANNER = re.compile(r'''"[^"]*"|'[^']*'|["']|[^ \t\r\n"'][^ \t\r\n]*''')
+
+KEYWORDS = {
+    '+': TokenType.OP_ADD,
+    '-': TokenType.OP_SUB,
+    '.': TokenType.OP_PRINT,
+    '*': TokenType.OP_MUL,
+    '/': TokenType.OP_DIV,
+    'DUP': TokenType.OP_DUP,
+    'dup': TokenType.OP_DUP,
+    'SWAP': TokenType.OP_SWAP,
+    'swap': TokenType.OP_SWAP,
+    'DROP': TokenType.OP_DROP,
+    'drop': TokenType.OP_DROP,
+    'EMIT': TokenType.OP_EMIT,
+    'emit': TokenType.OP_EMIT,
+    ':': TokenType.OP_COLON,
+    ';': TokenType.OP_SEMICOLON,
+    '=': TokenType.OP_EQ,
+    'STACK': TokenType.DEBUG_STACK,
+    'DICT': TokenType.DEBUG_DICT,
+    'if': TokenType.OP_IF,
+    'then': TokenType.OP_THEN,
+    'end': TokenType.OP_THEN,
+    'else': TokenType.OP_ELSE,
+    'puts': TokenType.OP_PUTS,
+    '>': TokenType.OP_GT,
+    '<': TokenType.OP_LT,
+    'and': TokenType.OP_AND,
+    'or': TokenType.OP_OR,
+    'invert': TokenType.OP_INVERT,
+    'mod': TokenType.OP_MOD,
+    'do': TokenType.OP_DO,
+    'loop': TokenType.OP_LOOP,
+    'cr': TokenType.OP_CR,
+}
+
+
 class Lexer():
-    def __init__(self, path, lines):
+    def __init__(self, path, lines, line_number: int = 1):
         self.path = path
+        # any iterable of lines, an open file is read lazily
         self.lines = lines
+        # number of the first line, the repl continues counting across lexers
+        self.line_number = line_number
         self.program = []
 
     def get_program(self):
-        self.create_program()
-        self.program.append(Token(TokenType.EOF, None, self.path, -1))
+        self.program = list(self.tokens())
         return self.program
 
-    def create_program(self):
-        self.line_counter = 1
+    def tokens(self):
+        '''yields the tokens of all lines followed by EOF'''
+        path = self.path
+        keywords = KEYWORDS
+        file = LOCATIONS.file_index(path)
+        line_counter = self.line_number
         for line in self.lines:
-            cmds = shlex.split(line, posix=False)
-            for cmd in cmds:
-                if cmd.isdigit():
-                    self.cmd_number(cmd)
-                elif cmd == "+":
-                    self.cmd_add(cmd)
-                elif cmd == "-":
-                    self.cmd_sub(cmd)
-                elif cmd == ".":
-                    self.cmd_print(cmd)
-                elif cmd == "*":
-                    self.cmd_mul(cmd)
-                elif cmd == "/":
-                    self.cmd_div(cmd)
-                elif cmd == "DUP" or cmd == "dup":
-                    self.cmd_dup(cmd)
-                elif cmd == "SWAP" or cmd == "swap":
-                    self.cmd_swap(cmd)
-                elif cmd == "DROP" or cmd == "drop":
-                    self.cmd_drop(cmd)
-                elif cmd == "EMIT" or cmd == "emit":
-                    self.cmd_emit(cmd)
-                elif cmd == ":":
-                    self.cmd_colon(cmd)
-                elif cmd == ";":
-                    self.cmd_semicolon(cmd)
-                elif cmd == "=":
-                    self.cmd_eq(cmd)
-                elif cmd == "STACK":
-                    self.cmd_stack(cmd)
-                elif cmd == "DICT":
-                    self.cmd_dict(cmd)
-                elif cmd == "if":
-                    self.cmd_if(cmd)
-                elif cmd == "then" or cmd == "end":
-                    self.cmd_then(cmd)
-                elif cmd == "else":
-                    self.cmd_else(cmd)
-                elif cmd == "puts":
-                    self.cmd_puts(cmd)
-                elif cmd == ">":
-                    self.cmd_gt(cmd)
-                elif cmd == "<":
-                    self.cmd_lt(cmd)
-                elif cmd == "and":
-                    self.cmd_and(cmd)
-                elif cmd == "or":
-                    self.cmd_or(cmd)
-                elif cmd == "invert":
-                    self.cmd_invert(cmd)
-                elif cmd == "mod":
-                    self.cmd_mod(cmd)
-                elif cmd == "do":
-                    self.cmd_do(cmd)
-                elif cmd == "loop":
-                    self.cmd_loop(cmd)
-                elif cmd == "cr":
-                    self.cmd_cr(cmd)
+            location = (line_counter << 16) | file
+            for cmd in SCANNER.findall(line):
+                tokenType = keywords.get(cmd)
+                if tokenType is not None:
+                    yield Token(tokenType, None, location)
+                elif cmd.isdigit():
+                    yield Token(TokenType.OP_NUMBER, int(cmd), location)
+                elif cmd[-1] == '?':
+                    yield Token(TokenType.OP_IF_WORD, cmd, location)
+                elif cmd == '"' or cmd == "'":
+                    raise NoClosingQuotationError(path, line_counter)
+                elif cmd[0] == '"' and cmd[-1] == '"':
+                    yield Token(TokenType.OP_STRING, cmd, location)
                 else:
-                    if cmd[-1] == '?':
-                        self.cmd_if_word(cmd)
-                    elif cmd[0] == '"' and cmd[-1] == '"':
-                        self.cmd_string(cmd)
-                    else:
-                        self.cmd_word(cmd)
-            self.line_counter += 1
-    # --------------------------
-
-    def cmd_number(self, cmd):
-        self.program.append(Token(TokenType.OP_NUMBER, int(cmd), self.path, self.line_counter))
-
-    def cmd_add(self, cmd):
-        self.program.append(Token(TokenType.OP_ADD, None, self.path, self.line_counter))
-
-    def cmd_sub(self, cmd):
-        self.program.append(Token(TokenType.OP_SUB, None, self.path, self.line_counter))
-
-    def cmd_mul(self, cmd):
-        self.program.append(Token(TokenType.OP_MUL, None, self.path, self.line_counter))
-
-    def cmd_div(self, cmd):
-        self.program.append(Token(TokenType.OP_DIV, None, self.path, self.line_counter))
-
-    def cmd_dup(self, cmd):
-        self.program.append(Token(TokenType.OP_DUP, None, self.path, self.line_counter))
-
-    def cmd_swap(self, cmd):
-        self.program.append(Token(TokenType.OP_SWAP, None, self.path, self.line_counter))
-
-    def cmd_drop(self, cmd):
-        self.program.append(Token(TokenType.OP_DROP, None, self.path, self.line_counter))
-
-    def cmd_emit(self, cmd):
-        self.program.append(Token(TokenType.OP_EMIT, None, self.path, self.line_counter))
-
-    def cmd_eq(self, cmd):
-        self.program.append(Token(TokenType.OP_EQ, None, self.path, self.line_counter))
-
-    def cmd_stack(self, cmd):
-        self.program.append(Token(TokenType.DEBUG_STACK, None, self.path, self.line_counter))
-
-    def cmd_dict(self, cmd):
-        self.program.append(Token(TokenType.DEBUG_DICT, None, self.path, self.line_counter))
-
-    def cmd_print(self, cmd):
-        self.program.append(Token(TokenType.OP_PRINT, None, self.path, self.line_counter))
-
-    def cmd_word(self, cmd):
-        self.program.append(Token(TokenType.OP_WORD, cmd, self.path, self.line_counter))
-
-    def cmd_colon(self, cmd):
-        self.program.append(Token(TokenType.OP_COLON, None, self.path, self.line_counter))
-
-    def cmd_semicolon(self, cmd):
-        self.program.append(Token(TokenType.OP_SEMICOLON, None, self.path, self.line_counter))
-
-    def cmd_if(self, cmd):
-        self.program.append(Token(TokenType.OP_IF, None, self.path, self.line_counter))
-
-    def cmd_then(self, cmd):
-        self.program.append(Token(TokenType.OP_THEN, None, self.path, self.line_counter))
-
-    def cmd_if_word(self, cmd):
-        self.program.append(Token(TokenType.OP_IF_WORD, cmd, self.path, self.line_counter))
-
-    def cmd_puts(self, cmd):
-        self.program.append(Token(TokenType.OP_PUTS, None, self.path, self.line_counter))
-
-    def cmd_string(self, cmd):
-        self.program.append(Token(TokenType.OP_STRING, cmd, self.path, self.line_counter))
-
-    def cmd_lt(self, cmd):
-        self.program.append(Token(TokenType.OP_LT, None, self.path, self.line_counter))
-
-    def cmd_gt(self, cmd):
-        self.program.append(Token(TokenType.OP_GT, None, self.path, self.line_counter))
-
-    def cmd_and(self, cmd):
-        self.program.append(Token(TokenType.OP_AND, None, self.path, self.line_counter))
-
-    def cmd_or(self, cmd):
-        self.program.append(Token(TokenType.OP_OR, None, self.path, self.line_counter))
-
-    def cmd_invert(self, cmd):
-        self.program.append(Token(TokenType.OP_INVERT, None, self.path, self.line_counter))
-
-    def cmd_mod(self, cmd):
-        self.program.append(Token(TokenType.OP_MOD, None, self.path, self.line_counter))
-
-    def cmd_else(self, cmd):
-        self.program.append(Token(TokenType.OP_ELSE, None, self.path, self.line_counter))
-
-    def cmd_do(self, cmd):
-        self.program.append(Token(TokenType.OP_DO, None, self.path, self.line_counter))
-
-    def cmd_loop(self, cmd):
-        self.program.append(Token(TokenType.OP_LOOP, None, self.path, self.line_counter))
-
-    def cmd_cr(self, cmd):
-        self.program.append(Token(TokenType.OP_CR, None, self.path, self.line_counter))
+                    yield Token(TokenType.OP_WORD, cmd, location)
+            line_counter += 1
+        yield Token(TokenType.EOF, None, LOCATIONS.get(path, -1))
@@ -1,11 +1,12 @@
 from typing import List
-from src.lexer import Token, TokenType
-from src.stack import Stack
+from src.lexer import Token
 from src.error import Error, InvalidSyntaxError, NotDefinedError, NotEnoughOperantsError
 from src.prog import Program
 
 
 class Node():
+    __slots__ = ('token',)
+
     def __init__(self, token: Token) -> None:
         self.token = token
 
@@ -18,25 +19,16 @@ class Node():
     def simulate(self, prog: Program):
         raise NotImplementedError()
 
-    def compile(self, prog: Program) -> str:
-        '''returns the x86 64 assembly for the current node'''
-        raise NotImplementedError()
-        return f';not implemenmted!!'
-
 
 class NodeNumber(Node):
+    __slots__ = ()
+
     def __init__(self, token: Token) -> None:
         super().__init__(token)
 
     def simulate(self, prog: Program):
         prog.stack.push(int(self.token.value))
 
-    def compile(self, prog: Program) -> str:
-        comp = f';--- push {self.token.value} to stack ---\n'
-        comp += f'    mov rax, {self.token.value}\n'
-        comp += f'    push rax\n'
-        return comp
-
     def __str__(self) -> str:
         return self.__repr__()
 
@@ -45,24 +37,17 @@ class NodeNumber(Node):
 
 
 class NodeAdd(Node):
+    __slots__ = ()
+
     def __init__(self, token: Token) -> None:
         super().__init__(token)
 
     def simulate(self, prog: Program):
-        if len(prog.stack) < 2:
+        if prog.checked and len(prog.stack) < 2:
             raise NotEnoughOperantsError(self.token.file_name, self.token.line_number, 2)
-        a = prog.stack.pop()
-        b = prog.stack.pop()
+        b, a = prog.stack.pop_n(2)
         prog.stack.push(a + b)
 
-    def compile(self, prog: Program) -> str:
-        comp = f';--- add two numbers ---\n'
-        comp += f'    pop rax\n'
-        comp += f'    pop rbx\n'
-        comp += f'    add rax, rbx\n'
-        comp += f'    push rax\n'
-        return comp
-
     def __str__(self) -> str:
         return self.__repr__()
 
@@ -71,24 +56,17 @@ class NodeAdd(Node):
 
 
 class NodeSubtract(Node):
+    __slots__ = ()
+
     def __init__(self, token: Token) -> None:
         super().__init__(token)
 
     def simulate(self, prog: Program):
-        if len(prog.stack) < 2:
+        if prog.checked and len(prog.stack) < 2:
             raise NotEnoughOperantsError(self.token.file_name, self.token.line_number, 2)
-        a = prog.stack.pop()
-        b = prog.stack.pop()
+        b, a = prog.stack.pop_n(2)
         prog.stack.push(b - a)
 
-    def compile(self, prog: Program) -> str:
-        comp = f';--- subtract two numbers ---\n'
-        comp += f'    pop rax\n'
-        comp += f'    pop rbx\n'
-        comp += f'    sub rbx, rax\n'
-        comp += f'    push rax\n'
-        return comp
-
     def __str__(self) -> str:
         return self.__repr__()
 
@@ -97,21 +75,17 @@ class NodeSubtract(Node):
 
 
 class NodePrint(Node):
+    __slots__ = ()
+
     def __init__(self, token: Token) -> None:
         super().__init__(token)
 
     def simulate(self, prog: Program):
-        if len(prog.stack) < 1:
+        if prog.checked and len(prog.stack) < 1:
             raise NotEnoughOperantsError(self.token.file_name, self.token.line_number, 1)
         a = prog.stack.pop()
         print(a)
 
-    def compile(self, prog: Program) -> str:
-        comp = f';--- print number ---\n'
-        comp += f'    pop rdi\n'
-        comp += f'    call print\n'
-        return comp
-
     def __str__(self) -> str:
         return self.__repr__()
 
@@ -120,24 +94,17 @@ class NodePrint(Node):
 
 
 class NodeMultiply(Node):
+    __slots__ = ()
+
     def __init__(self, token: Token) -> None:
         super().__init__(token)
 
     def simulate(self, prog: Program):
-        if len(prog.stack) < 2:
+        if prog.checked and len(prog.stack) < 2:
             raise NotEnoughOperantsError(self.token.file_name, self.token.line_number, 2)
-        a = prog.stack.pop()
-        b = prog.stack.pop()
+        b, a = prog.stack.pop_n(2)
         prog.stack.push(a * b)
 
-    def compile(self, prog: Program) -> str:
-        comp = f';--- multiplies two numbers ---\n'
-        comp += f'    pop rax\n'
-        comp += f'    pop rbx\n'
-        comp += f'    imul rax, rbx\n'
-        comp += f'    push rax\n'
-        return comp
-
     def __str__(self) -> str:
         return self.__repr__()
 
@@ -146,23 +113,16 @@ class NodeMultiply(Node):
 
 
 class NodeDivide(Node):
+    __slots__ = ()
+
     def __init__(self, token: Token) -> None:
         super().__init__(token)
 
     def simulate(self, prog: Program):
-        if len(prog.stack) < 2:
+        if prog.checked and len(prog.stack) < 2:
             raise NotEnoughOperantsError(self.token.file_name, self.token.line_number, 2)
-        a = prog.stack.pop()
-        b = prog.stack.pop()
-        prog.stack.push(b / a)
-
-    def compile(self, prog: Program) -> str:
-        comp = f';--- divides two numbers ---\n'
-        comp += f'    pop rax\n'
-        comp += f'    pop rbx\n'
-        comp += f'    idiv rax, rbx\n'
-        comp += f'    push rax\n'
-        return comp
+        b, a = prog.stack.pop_n(2)
+        prog.stack.push(int(b / a))
 
     def __str__(self) -> str:
         return self.__repr__()
@@ -172,23 +132,18 @@ class NodeDivide(Node):
 
 
 class NodeDupilcate(Node):
+    __slots__ = ()
+
     def __init__(self, token: Token) -> None:
         super().__init__(token)
 
     def simulate(self, prog: Program):
-        if len(prog.stack) < 2:
-            raise NotEnoughOperantsError(self.token.file_name, self.token.line_number, 2)
+        if prog.checked and len(prog.stack) < 1:
+            raise NotEnoughOperantsError(self.token.file_name, self.token.line_number, 1)
         a = prog.stack.pop()
         prog.stack.push(a)
         prog.stack.push(a)
 
-    def compile(self, prog: Program) -> str:
-        comp = f';--- dupilicates a number ---\n'
-        comp += f'    pop rax\n'
-        comp += f'    push rax\n'
-        comp += f'    push rax\n'
-        return comp
-
     def __str__(self) -> str:
         return self.__repr__()
 
@@ -197,25 +152,18 @@ class NodeDupilcate(Node):
 
 
 class NodeSwap(Node):
+    __slots__ = ()
+
     def __init__(self, token: Token) -> None:
         super().__init__(token)
 
     def simulate(self, prog: Program):
-        if len(prog.stack) < 2:
+        if prog.checked and len(prog.stack) < 2:
             raise NotEnoughOperantsError(self.token.file_name, self.token.line_number, 2)
-        a = prog.stack.pop()
-        b = prog.stack.pop()
+        b, a = prog.stack.pop_n(2)
         prog.stack.push(a)
         prog.stack.push(b)
 
-    def compile(self, prog: Program) -> str:
-        comp = f';--- swapes two numbers ---\n'
-        comp += f'    pop rax\n'
-        comp += f'    pop rbx\n'
-        comp += f'    push rax\n'
-        comp += f'    push rax\n'
-        return comp
-
     def __str__(self) -> str:
         return self.__repr__()
 
@@ -224,19 +172,16 @@ class NodeSwap(Node):
 
 
 class NodeDrop(Node):
+    __slots__ = ()
+
     def __init__(self, token: Token) -> None:
         super().__init__(token)
 
     def simulate(self, prog: Program):
-        if len(prog.stack) < 1:
+        if prog.checked and len(prog.stack) < 1:
             raise NotEnoughOperantsError(self.token.file_name, self.token.line_number, 1)
         a = prog.stack.pop()
 
-    def compile(self, prog: Program) -> str:
-        comp = f';--- drops the first number ---\n'
-        comp += f'    pop rax\n'
-        return comp
-
     def __str__(self) -> str:
         return self.__repr__()
 
@@ -245,18 +190,17 @@ class NodeDrop(Node):
 
 
 class NodeEmit(Node):
+    __slots__ = ()
+
     def __init__(self, token: Token) -> None:
         super().__init__(token)
 
     def simulate(self, prog: Program):
-        if len(prog.stack) < 1:
+        if prog.checked and len(prog.stack) < 1:
             raise NotEnoughOperantsError(self.token.file_name, self.token.line_number, 1)
         a = prog.stack.pop()
         print(chr(int(a)))
 
-    def compile(self, prog: Program) -> str:
-        return super().compile()
-
     def __str__(self) -> str:
         return self.__repr__()
 
@@ -265,27 +209,17 @@ class NodeEmit(Node):
 
 
 class NodeEquals(Node):
+    __slots__ = ()
+
     def __init__(self, token: Token) -> None:
         super().__init__(token)
 
     def simulate(self, prog: Program):
-        if len(prog.stack) < 2:
+        if prog.checked and len(prog.stack) < 2:
             raise NotEnoughOperantsError(self.token.file_name, self.token.line_number, 2)
-        a = prog.stack.pop()
-        b = prog.stack.pop()
+        b, a = prog.stack.pop_n(2)
         prog.stack.push(int(a == b))
 
-    def compile(self, prog: Program) -> str:
-        comp = f';--- checks for equality of two numbers ---\n'
-        comp += f'    mov rcx, 0\n'  # false
-        comp += f'    mov rdx, 1\n'  # true
-        comp += f'    pop rax\n'
-        comp += f'    pop rbx\n'
-        comp += f'    cmp rax, rbx\n'
-        comp += f'    cmove rcx, rdx\n'  # move if zero (equal)
-        comp += f'    push rcx\n'
-        return comp
-
     def __str__(self) -> str:
         return self.__repr__()
 
@@ -294,15 +228,14 @@ class NodeEquals(Node):
 
 
 class NodeDebugStack(Node):
+    __slots__ = ()
+
     def __init__(self, token: Token) -> None:
         super().__init__(token)
 
     def simulate(self, prog: Program):
         print(prog.stack)
 
-    def compile(self, prog: Program) -> str:
-        return super().compile(prog)
-
     def __str__(self) -> str:
         return self.__repr__()
 
@@ -311,6 +244,8 @@ class NodeDebugStack(Node):
 
 
 class NodeDebugDict(Node):
+    __slots__ = ()
+
     def __init__(self, token: Token) -> None:
         super().__init__(token)
 
@@ -318,9 +253,6 @@ class NodeDebugDict(Node):
         for k, v in prog.dict.items():
             print(f'{k} -> {v}\n')
 
-    def compile(self, prog: Program) -> str:
-        return super().compile(prog)
-
     def __str__(self) -> str:
         return self.__repr__()
 
@@ -328,114 +260,47 @@ class NodeDebugDict(Node):
         return f'DebugDictNode'
 
 
+# counters of the loops around the running loop, i is the running loop itself
+OUTER_LOOPS = {'j': 1, 'k': 2}
+
+
 # TODO: refactor NodeCall in own classes and functions
 class NodeCall(Node):
+    __slots__ = ('name',)
+
     def __init__(self, token: Token) -> None:
         super().__init__(token)
         self.name = token.value
 
     def simulate(self, prog: Program):
+        # the loop counter of the loop whose body is running
+        if self.name == "i" and prog.loop is not None:
+            prog.stack.push(prog.loop[0])
+            return
+        # j and k are the counters of the loops around it
+        if self.name in OUTER_LOOPS and prog.loop is not None:
+            loop = prog.outer_loop(OUTER_LOOPS[self.name])
+            if loop is not None:
+                prog.stack.push(loop[0])
+                return
+
         if not self.name in prog.dict:
             raise NotDefinedError(self.token.file_name, self.token.line_number, self.name)
         node = prog.dict[self.name]
 
         if isinstance(node, NodeWord):
-            for i in range(len(node)):
-                prog.nodes.insert(prog.index + i + 1, node[i])
+            prog.call(node.content)
 
         elif isinstance(node, NodeLoop):
-            self.content = node.content
-            self.body = node.body
-
-            # simulate loop body
-            for el in self.content:
-                el.simulate(prog)
+            # content pushes the from to numbers
+            prog.execute(node.content)
 
-            if len(prog.stack) < 2:
+            if prog.checked and len(prog.stack) < 2:
                 raise NotEnoughOperantsError(self.token.file_name, self.token.line_number, 2)
 
-            a = prog.stack.pop()  # begin
-            b = prog.stack.pop()  # end
-            self.counter = a
-
-            while self.counter < b:
-                # simulate body but check for Word "i" -> replace with self.counter
-
-                for el in self.body:
-                    if isinstance(el, NodeCall):
-                        if el.name == "i":
-                            token = Token(TokenType.OP_NUMBER, self.counter, "internal counter variable", -1)
-                            node = NodeNumber(token)
-                            node.simulate(prog)
-                        else:
-                            # normal
-                            el.simulate(prog)
-                    else:
-                        el.simulate(prog)
-
-                self.counter += 1
-
-    def compile(self, prog: Program) -> str:
-        if not self.name in prog.dict:
-            raise NotDefinedError(self.token.file_name, self.token.line_number, self.name)
-        node = prog.dict[self.name]
-
-        if isinstance(node, NodeWord):
-            for i in range(len(node)):
-                prog.nodes.insert(prog.index + i + 1, node[i])
-            return ""
-        elif isinstance(node, NodeLoop):
-            self.content = node.content
-            self.body = node.body
-
-            counter_start = prog.get_counter_label()
-            counter_end = prog.get_counter_label()
-            prog.counters.append(counter_start)
-            prog.counters.append(counter_end)
-
-            loop_start = prog.get_label()
-            loop_body_start = prog.get_label()
-            loop_end = prog.get_label()
-            comp = f'; loop start\n'
-            comp += f'{loop_start}:\n'
-            for el in self.content:
-                comp += el.compile(prog)
-            # added content part ...
-
-            # get from to numbers
-            comp += f'    pop rax\n'  # start number
-            comp += f'    mov [{counter_start}], rax\n'  # move start number in counter_start
-            comp += f'    pop rax\n'  # end number
-            comp += f'    mov [{counter_end}], rax\n'  # move start number in counter_end
-
-            # body begin
-            comp += f'; loop body begin\n'
-            comp += f'{loop_body_start}:\n'
-            for el in self.body:
-                if isinstance(el, NodeCall):
-                    if el.name == "i":
-                        comp += f'    mov rax, [{counter_start}]\n'
-                        comp += f'    push rax\n'
-                    else:
-                        comp += el.compile(prog)
-                else:
-                    comp += el.compile(prog)
-
-            # count up
-            comp += f'    mov rax, [{counter_start}]\n'
-            comp += f'    inc rax\n'
-            comp += f'    mov  [{counter_start}], rax\n'
-
-            # check loop condition
-            comp += f'    mov rax, [{counter_start}]\n'
-            comp += f'    mov rbx, [{counter_end}]\n'
-            comp += f'    cmp rax, rbx\n'
-            comp += f'    jne {loop_body_start}\n'  # if not equal (-> less) jump back to body start
-
-            comp += f';loop end\n'
-            comp += f'{loop_end}:\n'
-            comp += f'    nop\n'
-            return comp
+            b, a = prog.stack.pop_n(2)  # end, begin
+            if a < b:
+                prog.call(node.body, [a, b])
 
     def __str__(self) -> str:
         s = f'NodeCall:\n'
@@ -447,17 +312,15 @@ class NodeCall(Node):
 
 
 class NodeWord(Node):
+    __slots__ = ('name', 'content')
+
     def __init__(self, name: str, content: List[Token]) -> None:
         super().__init__(None)
         self.name = name
         self.content = content
 
     def simulate(self, prog: Program):
-        prog.dict[self.name] = self.content
-
-    def compile(self, prog: Program) -> str:
-        prog.dict[self.name] = self.content
-        return ""
+        prog.dict[self.name] = self
 
     def __str__(self) -> str:
         return self.__repr__()
@@ -472,23 +335,18 @@ class NodeWord(Node):
 
 
 class NodeString(Node):
+    __slots__ = ('string', 'index', 'length')
+
     def __init__(self, token: Token) -> None:
         super().__init__(token)
         self.string = token.value
+        # position in the string pool of the program, set by the parser
+        self.index = None
+        self.length = len(self.string[1:-1].encode())
 
     def simulate(self, prog: Program):
-        prog.strings.append(self.string[1:-1])
-        index = len(prog.strings) - 1
-        prog.stack.push(index)  # pointer
-        prog.stack.push(len(self.string))  # length of string
-
-    def compile(self, prog: Program) -> str:
-        index = f'string_{len(prog.strings)}'  # string_0, string_1, ...
-        prog.strings.append(f'{index}: db {self.string}')  # , 0x0a, 0x0d')
-        comp = f';---- string ----\n'
-        comp += f'    push {index}\n'  # push address
-        comp += f'    push {len(self.string)}\n'
-        return comp
+        prog.stack.push(self.index)  # pointer
+        prog.stack.push(self.length)  # length of string
 
     def __str__(self) -> str:
         return self.__repr__()
@@ -500,23 +358,16 @@ class NodeString(Node):
 
 
 class NodePuts(Node):
+    __slots__ = ()
+
     def __init__(self, token: Token) -> None:
         super().__init__(token)
 
     def simulate(self, prog: Program):
-        if len(prog.stack) < 2:
+        if prog.checked and len(prog.stack) < 2:
             raise NotEnoughOperantsError(self.token.file_name, self.token.line_number, 2)
-        a = prog.stack.pop()  # length
-        b = prog.stack.pop()  # pointer
-        string = prog.strings[b]
-        print(string)
-
-    def compile(self, prog: Program) -> str:
-        comp = f';--- prints string ---\n'
-        comp += f'    pop rdx\n'  # length
-        comp += f'    pop rsi\n'  # address / label
-        comp += f'    call puts\n'
-        return comp
+        b, a = prog.stack.pop_n(2)  # pointer, length
+        print(prog.strings[b])
 
     def __str__(self) -> str:
         return self.__repr__()
@@ -526,27 +377,17 @@ class NodePuts(Node):
 
 
 class NodeLessThan(Node):
+    __slots__ = ()
+
     def __init__(self, token: Token) -> None:
         super().__init__(token)
 
     def simulate(self, prog: Program):
-        if len(prog.stack) < 2:
+        if prog.checked and len(prog.stack) < 2:
             raise NotEnoughOperantsError(self.token.file_name, self.token.line_number, 2)
-        a = prog.stack.pop()
-        b = prog.stack.pop()
+        b, a = prog.stack.pop_n(2)
         prog.stack.push(int(a > b))
 
-    def compile(self, prog: Program) -> str:
-        comp = f';--- checks for equality of two numbers ---\n'
-        comp += f'    mov rcx, 0\n'  # true
-        comp += f'    mov rdx, 1\n'  # false
-        comp += f'    pop rax\n'
-        comp += f'    pop rbx\n'
-        comp += f'    cmp rax, rbx\n'
-        comp += f'    cmovg rcx, rdx\n'  # move if greater than (the opposite)
-        comp += f'    push rcx\n'
-        return comp
-
     def __str__(self) -> str:
         return self.__repr__()
 
@@ -555,27 +396,17 @@ class NodeLessThan(Node):
 
 
 class NodeGreaterThan(Node):
+    __slots__ = ()
+
     def __init__(self, token: Token) -> None:
         super().__init__(token)
 
     def simulate(self, prog: Program):
-        if len(prog.stack) < 2:
+        if prog.checked and len(prog.stack) < 2:
             raise NotEnoughOperantsError(self.token.file_name, self.token.line_number, 2)
-        a = prog.stack.pop()
-        b = prog.stack.pop()
+        b, a = prog.stack.pop_n(2)
         prog.stack.push(int(a < b))
 
-    def compile(self, prog: Program) -> str:
-        comp = f';--- checks for equality of two numbers ---\n'
-        comp += f'    mov rcx, 0\n'  # true
-        comp += f'    mov rdx, 1\n'  # false
-        comp += f'    pop rax\n'
-        comp += f'    pop rbx\n'
-        comp += f'    cmp rax, rbx\n'
-        comp += f'    cmovl rcx, rdx\n'  # move if less than
-        comp += f'    push rcx\n'
-        return comp
-
     def __str__(self) -> str:
         return self.__repr__()
 
@@ -584,36 +415,17 @@ class NodeGreaterThan(Node):
 
 
 class NodeAnd(Node):
+    __slots__ = ()
+
     def __init__(self, token: Token) -> None:
         super().__init__(token)
 
     def simulate(self, prog: Program):
-        if len(prog.stack) < 2:
+        if prog.checked and len(prog.stack) < 2:
             raise NotEnoughOperantsError(self.token.file_name, self.token.line_number, 2)
-        a = prog.stack.pop()
-        b = prog.stack.pop()
+        b, a = prog.stack.pop_n(2)
         prog.stack.push(int(a and b))
 
-    def compile(self, prog: Program) -> str:
-        # compare and jump to false if false
-        # if not jumped push 1 and jump to end
-        comp = f';---- and ----\n'
-        comp += f'    pop rax\n'
-        comp += f'    pop rbx\n'
-        comp += f'    cmp rax, 1\n'
-        false = prog.get_label()
-        comp += f'    jne {false}\n'
-        comp += f'    cmp rbx, 1\n'
-        comp += f'    jne {false}\n'
-        comp += f'    push 1\n'         # true
-        end = prog.get_label()
-        comp += f'    jmp {end}\n'
-        comp += f'{false}:\n'
-        comp += f'    push 0\n'         # false
-        comp += f'{end}:\n'
-        comp += f'    nop\n'
-        return comp
-
     def __str__(self) -> str:
         return self.__repr__()
 
@@ -622,34 +434,17 @@ class NodeAnd(Node):
 
 
 class NodeOr(Node):
+    __slots__ = ()
+
     def __init__(self, token: Token) -> None:
         super().__init__(token)
 
     def simulate(self, prog: Program):
-        if len(prog.stack) < 2:
+        if prog.checked and len(prog.stack) < 2:
             raise NotEnoughOperantsError(self.token.file_name, self.token.line_number, 2)
-        a = prog.stack.pop()
-        b = prog.stack.pop()
+        b, a = prog.stack.pop_n(2)
         prog.stack.push(int(a or b))
 
-    def compile(self, prog: Program) -> str:
-        comp = f';---- or ----\n'
-        comp += f'    pop rax\n'
-        comp += f'    pop rbx\n'
-        true = prog.get_label()
-        end = prog.get_label()
-        comp += f'    cmp rax, 1\n'
-        comp += f'    je {true}\n'
-        comp += f'    cmp rbx, 1\n'
-        comp += f'    je {true}\n'
-        comp += f'    push 0\n'
-        comp += f'    jmp {end}\n'
-        comp += f'{true}:\n'
-        comp += f'    push 1\n'
-        comp += f'{end}:\n'
-        comp += f'    nop'
-        return comp
-
     def __str__(self) -> str:
         return self.__repr__()
 
@@ -658,18 +453,17 @@ class NodeOr(Node):
 
 
 class NodeInvert(Node):
+    __slots__ = ()
+
     def __init__(self, token: Token) -> None:
         super().__init__(token)
 
     def simulate(self, prog: Program):
-        if len(prog.stack) < 1:
+        if prog.checked and len(prog.stack) < 1:
             raise NotEnoughOperantsError(self.token.file_name, self.token.line_number, 1)
         a = prog.stack.pop()
         prog.stack.push(int(not a))
 
-    def compile(self, prog: Program) -> str:
-        return super().compile(prog)
-
     def __str__(self) -> str:
         return self.__repr__()
 
@@ -678,27 +472,17 @@ class NodeInvert(Node):
 
 
 class NodeMod(Node):
+    __slots__ = ()
+
     def __init__(self, token: Token) -> None:
         super().__init__(token)
 
     def simulate(self, prog: Program):
-        if len(prog.stack) < 2:
+        if prog.checked and len(prog.stack) < 2:
             raise NotEnoughOperantsError(self.token.file_name, self.token.line_number, 2)
-        a = prog.stack.pop()
-        b = prog.stack.pop()
+        b, a = prog.stack.pop_n(2)
         prog.stack.push(int(b % a))
 
-    def compile(self, prog: Program) -> str:
-        comp = f';---- mod ----\n'
-        comp += f'    xor rax, rax\n'
-        comp += f'    xor rdx, rdx\n'
-        comp += f'    pop rbx\n'
-        comp += f'    pop rax\n'    # divide rax by rbx
-        comp += f'    div rbx\n'
-        # remainder stored in rdx
-        comp += f'    push rdx\n'
-        return comp
-
     def __str__(self) -> str:
         return self.__repr__()
 
@@ -707,6 +491,8 @@ class NodeMod(Node):
 
 
 class NodeIf(Node):
+    __slots__ = ('name', 'condition', 'content', 'else_part')
+
     def __init__(self, token: Token, name: str) -> None:
         super().__init__(token)
         self.name = name
@@ -717,10 +503,6 @@ class NodeIf(Node):
     def simulate(self, prog: Program):
         prog.dict[self.name] = (self.condition, self.content, self.else_part)
 
-    def compile(self, prog: Program) -> str:
-        prog.dict[self.name] = (self.condition, self.content, self.else_part)
-        return ''
-
     def __str__(self) -> str:
         return self.__repr__()
 
@@ -740,6 +522,8 @@ class NodeIf(Node):
 
 
 class NodeCallIf(Node):
+    __slots__ = ('name', 'condition', 'content', 'else_part')
+
     def __init__(self, token: Token) -> None:
         super().__init__(token)
         self.name = self.token.value
@@ -757,53 +541,20 @@ class NodeCallIf(Node):
 
         if self.condition == []:
             raise NotEnoughOperantsError(self.token.file_name, self.token.line_number, -1)
-        # add condition part
-        for i in range(len(self.condition)):
-            self.condition[i].simulate(prog)
+        # condition part
+        prog.execute(self.condition)
 
         # last thing on the stack must be 0 or 1
+        if prog.checked and len(prog.stack) < 1:
+            raise NotEnoughOperantsError(self.token.file_name, self.token.line_number, 1)
         a = prog.stack.pop()
         if a != 0 and a != 1:
             raise InvalidSyntaxError(self.token.file_name, self.token.line_number, self.token)
 
         if a == 1:
-            for i in range(len(self.content)):
-                prog.nodes.insert(prog.index + i + 1, self.content[i])
+            prog.call(self.content)
         else:
-            for i in range(len(self.else_part)):
-                prog.nodes.insert(prog.index + i + 1, self.else_part[i])
-
-    def compile(self, prog: Program) -> str:
-        self.condition = prog.dict[self.name][0]
-        self.content = prog.dict[self.name][1]
-        self.else_part = prog.dict[self.name][2]
-
-        if self.condition == []:
-            raise NotEnoughOperantsError(self.token.file_name, self.token.line_number, -1)
-        comp = f';---- if node ----\n'
-        for el in self.condition:
-            comp += el.compile(prog)
-
-        comp += f'    pop rax\n'
-        comp += f'    cmp rax, 1\n'  # true
-        else_part = prog.get_label()
-        comp += f'    jne {else_part}\n'
-
-        end = prog.get_label()
-        # true part
-        for el in self.content:
-            comp += el.compile(prog)
-        comp += f'    jmp {end}\n'
-
-        # else part
-        comp += f'{else_part}:\n'
-        for el in self.else_part:
-            comp += el.compile(prog)
-
-        comp += f'{end}:\n'
-        comp += f'    nop\n'
-
-        return comp
+            prog.call(self.else_part)
 
     def __str__(self) -> str:
         return self.__repr__()
@@ -815,6 +566,8 @@ class NodeCallIf(Node):
 
 
 class NodeLoop(Node):
+    __slots__ = ('name', 'content', 'body', 'counter')
+
     def __init__(self, token: Token, name: str,  content: List[Node], body: List[Node]) -> None:
         super().__init__(token)
         self.name = name
@@ -825,9 +578,6 @@ class NodeLoop(Node):
     def simulate(self, prog: Program):
         pass
 
-    def compile(self, prog: Program) -> str:
-        return f''
-
     def __str__(self) -> str:
         return self.__repr__()
 
@@ -844,17 +594,17 @@ class NodeLoop(Node):
 
 
 class NodeCarriageReturn(Node):
+    __slots__ = ('index', 'length')
+
     def __init__(self, token: Token) -> None:
         super().__init__(token)
+        # the newline in the string pool, set by the parser
+        self.index = None
+        self.length = 1
 
     def simulate(self, prog: Program):
-        string_token = Token(TokenType.OP_STRING, "\n", "internal", -1)
-        a = NodeString(string_token)
-        a.simulate(prog)
-
-    def compile(self, prog: Program) -> str:
-        # TODO: implement
-        return super().compile(prog)
+        prog.stack.push(self.index)  # pointer
+        prog.stack.push(self.length)
 
     def __str__(self) -> str:
         return self.__repr__()
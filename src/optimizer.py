@@ -0,0 +1,86 @@
+from typing import Iterable, Iterator, List
+from src.lexer import Token, TokenType
+from src.nodes import *
+from src.stack import wrap
+
+# only operations whose simulated and compiled results agree are folded, a is the top of
+# the stack. and, or, mod and divide differ between both (and returns the value in sim but
+# 0 or 1 compiled, mod of a negative number takes the sign of the divisor or the dividend)
+BINARY = {
+    NodeAdd: lambda b, a: b + a,
+    NodeSubtract: lambda b, a: b - a,
+    NodeMultiply: lambda b, a: b * a,
+    NodeEquals: lambda b, a: int(a == b),
+    NodeLessThan: lambda b, a: int(a > b),
+    NodeGreaterThan: lambda b, a: int(a < b),
+}
+
+def number(value: int, token: Token) -> NodeNumber:
+    return NodeNumber(Token(TokenType.OP_NUMBER, wrap(value), token.location))
+
+
+def value(node: Node) -> int:
+    return int(node.token.value)
+
+
+def reduce(out: List[Node]):
+    '''folds the end of out until nothing changes anymore
+
+    only nodes whose operands are in out are folded, "0 +", "dup drop" or "swap swap" stay
+    because they fail on a stack that is too small
+    '''
+    while out:
+        last = out[-1]
+        kind = type(last)
+        n = len(out)
+        before = out[-2] if n >= 2 else None
+
+        if kind in BINARY and n >= 3 and isinstance(before, NodeNumber) and isinstance(out[-3], NodeNumber):
+            result = BINARY[kind](value(out[-3]), value(before))
+            out[-3:] = [number(result, out[-3].token)]
+        elif kind is NodeInvert and isinstance(before, NodeNumber):
+            out[-2:] = [number(int(not value(before)), before.token)]
+        elif kind is NodeDupilcate and isinstance(before, NodeNumber):
+            out[-1] = number(value(before), before.token)
+        elif kind is NodeSwap and n >= 3 and isinstance(before, NodeNumber) and isinstance(out[-3], NodeNumber):
+            out[-3], out[-2] = before, out[-3]
+            del out[-1]
+        elif kind is NodeDrop and isinstance(before, NodeNumber):
+            del out[-2:]
+        else:
+            return
+
+
+def optimize_definition(node: Node):
+    if isinstance(node, NodeWord):
+        node.content = optimize(node.content)
+    elif isinstance(node, NodeIf):
+        node.condition = optimize(node.condition)
+        node.content = optimize(node.content)
+        node.else_part = optimize(node.else_part)
+    elif isinstance(node, NodeLoop):
+        node.content = optimize(node.content)
+        node.body = optimize(node.body)
+
+
+def optimize(nodes: List[Node]) -> List[Node]:
+    '''returns nodes with constant expressions folded and no-op shuffles removed'''
+    return list(optimize_statements(nodes))
+
+
+def optimize_statements(statements: Iterable[Node]) -> Iterator[Node]:
+    '''optimizes a stream of nodes, only the nodes that may still fold are held back'''
+    out: List[Node] = []
+    for node in statements:
+        optimize_definition(node)
+        out.append(node)
+        reduce(out)
+
+        # numbers at the end can still be folded by later nodes
+        keep = len(out)
+        while keep and isinstance(out[keep - 1], NodeNumber):
+            keep -= 1
+        if keep:
+            yield from out[:keep]
+            del out[:keep]
+    yield from out
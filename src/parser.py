@@ -1,4 +1,4 @@
-from typing import Dict, List, Tuple
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 from src.error import InvalidSyntaxError
 from src.lexer import Token, TokenType
 from src.nodes import *
@@ -6,31 +6,47 @@ from src.prog import Program
 
 
 class Parser():
-    def __init__(self, tokens: List[Token]) -> None:
-        self.tokens = tokens
-        self.index = 0
+    def __init__(self, tokens: Iterable[Token], dict: Optional[Dict] = None, strings: Optional[List[str]] = None) -> None:
+        # tokens are pulled one at a time, a list or a lexer generator both work
+        self.tokens = iter(tokens)
+        self.token = next(self.tokens, None)
+        # the repl passes the dictionary and string pool of its session
+        self.dict = dict if dict is not None else {'ADD': '+'}
+        # every distinct string literal once, nodes refer to them by index
+        self.strings = strings if strings is not None else []
+        self.string_ids = {string: i for i, string in enumerate(self.strings)}
+
+    def intern(self, string: str) -> int:
+        '''index of string in the string pool, added if it is not there yet'''
+        index = self.string_ids.get(string)
+        if index is None:
+            index = len(self.strings)
+            self.strings.append(string)
+            self.string_ids[string] = index
+        return index
 
     def advance(self):
-        self.index += 1
+        self.token = next(self.tokens, None)
 
     def get_token(self) -> Token:
-        if(self.index < len(self.tokens)):
-            return self.tokens[self.index]
+        if self.token is not None:
+            return self.token
         raise AttributeError()
 
     # ------------------
 
     def parse(self) -> Program:
-        self.nodes: List[Node] = []
-        self.dict = {'ADD': '+'}
+        self.nodes: List[Node] = list(self.statements())
+        program = Program(self.nodes, self.dict)
+        return program
 
+    def statements(self) -> Iterator[Node]:
+        '''yields the top level nodes as soon as they are parsed'''
         token = self.get_token()
         while token.tokenType != TokenType.EOF:
-            self.nodes.append(self.get_node(token))
+            yield self.get_node(token)
             self.advance()
             token = self.get_token()
-        program = Program(self.nodes, self.dict)
-        return program
 
     def is_conditional(self, token: Token):
         if token in [TokenType.OP_EQ, TokenType.OP_LT, TokenType.OP_GT]:
@@ -155,7 +171,9 @@ class Parser():
                 return node
 
         elif token.tokenType == TokenType.OP_STRING:
-            return NodeString(token)
+            node = NodeString(token)
+            node.index = self.intern(node.string[1:-1])
+            return node
         elif token.tokenType == TokenType.OP_PUTS:
             return NodePuts(token)
         elif token.tokenType == TokenType.OP_LT:
@@ -171,7 +189,9 @@ class Parser():
         elif token.tokenType == TokenType.OP_MOD:
             return NodeMod(token)
         elif token.tokenType == TokenType.OP_CR:
-            return NodeCarriageReturn(token)
+            node = NodeCarriageReturn(token)
+            node.index = self.intern('\n')
+            return node
         else:
             if token.value == None:
                 print(token)
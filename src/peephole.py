@@ -0,0 +1,220 @@
+import re
+from collections import Counter
+from typing import List, Optional
+
+# registers our runtime routines read and clobber
+CALLS = {
+    'print': ({'rdi'}, {'rax', 'rcx', 'rdx', 'rsi', 'rdi', 'r8', 'r9', 'r11'}),
+    'puts': ({'rsi', 'rdx'}, {'rax', 'rdi', 'rcx', 'r11'}),
+}
+
+# instructions that read their second operand, which may be a register or a 32 bit immediate
+IMMEDIATE = {'add', 'sub', 'imul', 'and', 'or', 'xor', 'cmp', 'mov'}
+
+REGISTERS = {'rax', 'rbx', 'rcx', 'rdx', 'rsi', 'rdi', 'rbp', 'rsp',
+             'r8', 'r9', 'r10', 'r11', 'r12', 'r13', 'r14', 'r15'}
+
+# code is optimized in chunks of this many lines so output can start early
+CHUNK = 1024
+
+
+def is_instruction(line: str) -> bool:
+    s = line.strip()
+    return s != '' and not s.startswith(';') and not s.endswith(':')
+
+
+def is_label(line: str) -> bool:
+    s = line.strip()
+    return s.endswith(':') and not s.startswith(';')
+
+
+def parse(line: str):
+    '''splits an instruction line into the mnemonic and its operands'''
+    s = line.split(';')[0].strip()
+    parts = s.split(None, 1)
+    operands = [o.strip() for o in parts[1].split(',')] if len(parts) > 1 else []
+    return parts[0], operands
+
+
+def instruction(op: str, *operands: str) -> str:
+    return f'    {op} {", ".join(operands)}\n'
+
+
+def immediate(operand: str) -> Optional[int]:
+    try:
+        return int(operand, 0)
+    except ValueError:
+        return None
+
+
+def fits_imm32(value: int) -> bool:
+    return -0x80000000 <= value <= 0x7FFFFFFF
+
+
+def mentions(operand: str, reg: str) -> bool:
+    return re.search(rf'\b{reg}\b', operand) is not None
+
+
+class Peephole():
+    '''removes redundant instructions from the generated assembly and counts what it did'''
+
+    def __init__(self) -> None:
+        # removed instructions per rule, strength reductions replace one instruction by another
+        self.stats: Counter = Counter()
+        self.reduced = 0
+        self.buffer: List[str] = []
+
+    def feed(self, lines: List[str]) -> str:
+        '''takes lines of generated code, returns optimized code that is ready to be written'''
+        self.buffer.extend(lines)
+        if len(self.buffer) < CHUNK:
+            return ''
+        return self.flush()
+
+    def flush(self) -> str:
+        lines = self.optimize(self.buffer)
+        self.buffer = []
+        return ''.join(lines)
+
+    def removed(self) -> int:
+        return sum(self.stats.values())
+
+    def report(self) -> str:
+        s = f'peephole: removed {self.removed()} instructions'
+        if self.stats:
+            s += ' (' + ', '.join(f'{k}: {v}' for k, v in sorted(self.stats.items())) + ')'
+        return s + f', {self.reduced} multiplications turned into shifts'
+
+    # ------------------
+
+    def optimize(self, lines: List[str]) -> List[str]:
+        lines = list(lines)
+        while self.step(lines):
+            pass
+        return lines
+
+    def next_instruction(self, lines: List[str], i: int) -> int:
+        '''index of the next instruction or label after i, comments are skipped'''
+        i += 1
+        while i < len(lines) and not (is_instruction(lines[i]) or is_label(lines[i])):
+            i += 1
+        return i
+
+    def dead(self, lines: List[str], i: int, reg: str) -> bool:
+        '''true if reg is overwritten after line i before anything reads it'''
+        for line in lines[i + 1:]:
+            if is_label(line):
+                return False
+            if not is_instruction(line):
+                continue
+            op, operands = parse(line)
+            if op == 'call' and operands and operands[0] in CALLS:
+                reads, writes = CALLS[operands[0]]
+                if reg in reads:
+                    return False
+                if reg in writes:
+                    return True
+                continue
+            if op in ('call', 'ret', 'syscall', 'jmp') or op.startswith('j'):
+                return False
+            if op in ('mov', 'pop') and operands and operands[0] == reg:
+                return not any(mentions(o, reg) for o in operands[1:])
+            if op == 'xor' and operands == [reg, reg]:
+                return True
+            if any(mentions(o, reg) for o in operands):
+                return False
+            if op in ('div', 'idiv', 'mul', 'cqo') and reg in ('rax', 'rdx'):
+                return False
+        return False
+
+    def step(self, lines: List[str]) -> bool:
+        changed = False
+        i = 0
+        while i < len(lines):
+            line = lines[i]
+            if is_label(line):
+                j = self.next_instruction(lines, i)
+                # nop padding after a label
+                if j < len(lines) and is_instruction(lines[j]) and parse(lines[j])[0] == 'nop':
+                    del lines[j]
+                    self.stats['nop'] += 1
+                    changed = True
+                    continue
+                i += 1
+                continue
+            if not is_instruction(line):
+                i += 1
+                continue
+
+            op, operands = parse(line)
+            j = self.next_instruction(lines, i)
+            following = lines[j] if j < len(lines) else None
+            next_op, next_operands = parse(following) if following and is_instruction(following) else (None, [])
+
+            # push x / pop x and push x / pop y
+            if op == 'push' and next_op == 'pop':
+                if operands[0] == next_operands[0]:
+                    del lines[j]
+                    del lines[i]
+                    self.stats['push/pop'] += 2
+                else:
+                    lines[j] = instruction('mov', next_operands[0], operands[0])
+                    del lines[i]
+                    self.stats['push/pop'] += 1
+                changed = True
+                continue
+
+            # mov x, x and mov a, b followed by mov b, a
+            if op == 'mov' and len(operands) == 2 and operands[0] == operands[1]:
+                del lines[i]
+                self.stats['mov'] += 1
+                changed = True
+                continue
+            if op == 'mov' and next_op == 'mov' and next_operands == operands[::-1] and not operands[0].startswith('['):
+                del lines[j]
+                self.stats['mov'] += 1
+                changed = True
+                continue
+
+            # jmp to the label right after it
+            if op == 'jmp' and following is not None and is_label(following) and following.strip()[:-1] == operands[0]:
+                del lines[i]
+                self.stats['jmp'] += 1
+                changed = True
+                continue
+
+            # mov r, x followed by an instruction reading r: read x instead
+            if op == 'mov' and len(operands) == 2 and next_op is not None:
+                reg, source = operands
+                value = immediate(source)
+                if reg in REGISTERS and (source in REGISTERS or (value is not None and fits_imm32(value))):
+                    if next_op == 'push' and next_operands == [reg] and self.dead(lines, j, reg):
+                        lines[j] = instruction('push', source)
+                        del lines[i]
+                        self.stats['copy'] += 1
+                        changed = True
+                        continue
+                    if (next_op in IMMEDIATE and len(next_operands) == 2 and next_operands[1] == reg
+                            and next_operands[0] != reg and not next_operands[0].startswith('[')
+                            and self.dead(lines, j, reg)):
+                        lines[j] = instruction(next_op, next_operands[0], source)
+                        del lines[i]
+                        self.stats['copy'] += 1
+                        changed = True
+                        continue
+
+            # strength reduction of multiplications by powers of two
+            if op == 'imul' and len(operands) == 2:
+                value = immediate(operands[1])
+                if value == 1:
+                    del lines[i]
+                    self.stats['imul'] += 1
+                    changed = True
+                    continue
+                if value is not None and value > 1 and value & (value - 1) == 0:
+                    lines[i] = instruction('shl', operands[0], str(value.bit_length() - 1))
+                    self.reduced += 1
+                    changed = True
+
+            i += 1
+        return changed
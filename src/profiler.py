@@ -0,0 +1,183 @@
+import sys
+import time
+from typing import Dict, List, Tuple
+from src.error import StackOverflowError
+from src.lexer import LOCATIONS
+from src.nodes import NodeLoop, NodeWord
+from src.prog import Program
+
+# name of the top level statements in the word report and the collapsed stacks
+MAIN = '<main>'
+
+
+class WordStats():
+    __slots__ = ('calls', 'inclusive', 'exclusive')
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.inclusive = 0.0
+        self.exclusive = 0.0
+
+
+class ProfiledProgram(Program):
+    '''a program for the tree engine that records where the simulation spends its time
+
+    every frame is an activation of a word (words, loops and if words), the profiler keeps
+    a [name, start, time of callees] entry for each of them. besides the time per word it
+    counts the simulated nodes per node type and per source line.
+    '''
+
+    def __init__(self, nodes, dict, stack=None, strings=None) -> None:
+        super().__init__(nodes, dict, stack, strings)
+        self.node_counts: Dict[type, int] = {}
+        # token location -> simulated nodes
+        self.line_counts: Dict[int, int] = {}
+        self.word_stats: Dict[str, WordStats] = {}
+        # tuple of word names -> exclusive seconds, the collapsed stacks
+        self.stacks: Dict[Tuple[str, ...], float] = {}
+        # id of a body -> (name of its word, whether running it is a call of the word)
+        self.bodies: Dict[int, Tuple[str, bool]] = {}
+        # running words, nested activations of a word are counted once for its inclusive time
+        self.active: Dict[str, int] = {}
+        self.started = time.perf_counter()
+        self.activations: List[list] = [[MAIN, self.started, 0.0]]
+        self.stopped = None
+        # end of the last top level run, statements are parsed between the runs
+        self.paused = None
+
+    def body_name(self, body) -> Tuple[str, bool]:
+        '''name of the word a body belongs to, the dictionary is searched again for new bodies'''
+        known = self.bodies.get(id(body))
+        if known is not None:
+            return known
+        for name, value in self.dict.items():
+            if isinstance(value, NodeWord):
+                self.bodies[id(value.content)] = (name, True)
+            elif isinstance(value, NodeLoop):
+                # the loop bounds run once per call, the body once per iteration
+                self.bodies[id(value.content)] = (name, True)
+                self.bodies[id(value.body)] = (name, False)
+            elif isinstance(value, tuple):
+                condition, content, else_part = value
+                self.bodies[id(condition)] = (name, True)
+                self.bodies[id(content)] = (name, False)
+                self.bodies[id(else_part)] = (name, False)
+        return self.bodies.get(id(body), ('<unknown>', True))
+
+    def call(self, body, loop=None):
+        super().call(body, loop)
+        name, is_call = self.body_name(body)
+        stats = self.word_stats.get(name)
+        if stats is None:
+            stats = self.word_stats[name] = WordStats()
+        if is_call:
+            stats.calls += 1
+        self.active[name] = self.active.get(name, 0) + 1
+        self.activations.append([name, time.perf_counter(), 0.0])
+
+    def leave(self):
+        '''ends the activation of the word whose frame was just popped'''
+        name, start, callees = self.activations.pop()
+        elapsed = time.perf_counter() - start
+        stats = self.word_stats[name]
+        self.active[name] -= 1
+        if self.active[name] == 0:
+            stats.inclusive += elapsed
+        stats.exclusive += elapsed - callees
+        self.activations[-1][2] += elapsed
+        path = tuple(a[0] for a in self.activations) + (name,)
+        self.stacks[path] = self.stacks.get(path, 0.0) + elapsed - callees
+
+    def execute(self, body):
+        super().execute(body)
+        self.leave()
+
+    def run(self, depth: int = 0):
+        '''Program.run that also counts the nodes, only the time inside the top level runs counts'''
+        if depth == 0 and self.paused is not None:
+            # the time the next statement took to parse is left out of the profile
+            gap = time.perf_counter() - self.paused
+            self.started += gap
+            self.activations[0][1] += gap
+        node = None
+        node_counts = self.node_counts
+        line_counts = self.line_counts
+        try:
+            while True:
+                body = self.body
+                while self.index < len(body):
+                    node = body[self.index]
+                    self.index += 1
+                    cls = node.__class__
+                    node_counts[cls] = node_counts.get(cls, 0) + 1
+                    if node.token is not None:
+                        location = node.token.location
+                        line_counts[location] = line_counts.get(location, 0) + 1
+                    node.simulate(self)
+                    body = self.body
+
+                loop = self.loop
+                if loop is not None:
+                    loop[0] += 1
+                    if loop[0] < loop[1]:
+                        self.index = 0
+                        continue
+
+                if len(self.frames) == depth:
+                    return
+                self.body, self.index, self.loop = self.frames.pop()
+                self.leave()
+        except StackOverflowError as error:
+            if error.file_name is None and node is not None and node.token is not None:
+                error.file_name = node.token.file_name
+                error.line_number = node.token.line_number
+            raise
+        finally:
+            if depth == 0:
+                self.paused = time.perf_counter()
+
+    def stop(self):
+        '''ends the profile, words still running after an error are closed as well'''
+        while len(self.activations) > 1:
+            self.leave()
+        name, start, callees = self.activations[0]
+        self.stopped = self.paused if self.paused is not None else time.perf_counter()
+        total = self.stopped - start
+        stats = self.word_stats.setdefault(MAIN, WordStats())
+        stats.calls = 1
+        stats.inclusive = total
+        stats.exclusive = total - callees
+        self.stacks[(MAIN,)] = total - callees
+
+    def report(self, out=sys.stderr, top: int = 20):
+        '''hot spots sorted by exclusive time and by count, top rows of each table'''
+        total = self.stopped - self.started
+        nodes = sum(self.node_counts.values())
+        print(f'profile: {total * 1000:.2f} ms, {nodes} nodes simulated', file=out)
+
+        print(f'\n{"word":24} {"calls":>10} {"incl ms":>10} {"excl ms":>10} {"excl %":>7}', file=out)
+        words = sorted(self.word_stats.items(), key=lambda item: -item[1].exclusive)
+        for name, stats in words[:top]:
+            share = 100 * stats.exclusive / total if total else 0.0
+            print(f'{name:24} {stats.calls:10} {stats.inclusive * 1000:10.2f} '
+                  f'{stats.exclusive * 1000:10.2f} {share:6.1f}%', file=out)
+
+        print(f'\n{"node":24} {"count":>10}', file=out)
+        counts = sorted(self.node_counts.items(), key=lambda item: -item[1])
+        for cls, count in counts[:top]:
+            print(f'{cls.__name__:24} {count:10}', file=out)
+
+        print(f'\n{"line":24} {"count":>10}', file=out)
+        lines = sorted(self.line_counts.items(), key=lambda item: -item[1])
+        for location, count in lines[:top]:
+            line = f'{LOCATIONS.file_name(location)}:{LOCATIONS.line_number(location)}'
+            print(f'{line:24} {count:10}', file=out)
+
+    def write_stacks(self, path: str):
+        '''writes the collapsed stacks ("main;word;callee microseconds") flamegraph tools read'''
+        with open(path, 'w') as f:
+            for stack, seconds in sorted(self.stacks.items()):
+                us = round(seconds * 1e6)
+                if us > 0:
+                    f.write(f'{";".join(stack)} {us}\n')
+
@@ -1,23 +1,145 @@
-from src.stack import Stack
+from typing import List
+from src.error import StackOverflowError
+from src.stack import ArrayStack
+
+# registers that may hold the top items of the stack in compiled code
+CACHE_REGISTERS = ['r10', 'r11']
 
 
 class Program():
-    def __init__(self, nodes, dict):
+    def __init__(self, nodes, dict, stack=None, strings=None):
         self.nodes = nodes
         self.dict = dict
-        self.stack = Stack()
+        self.stack = stack if stack is not None else ArrayStack()
+        # currently simulated body, position in it and state of its loop ([counter, end] or None)
+        self.body = nodes
         self.index = 0
-        self.strings = []
-        self.counters = []
+        self.loop = None
+        # return stack of (body, index, loop) frames
+        self.frames = []
+        # nodes skip their operand checks while the statement is proven safe
+        self.checked = True
+        # string pool of the parser, string literals are indices into it
+        self.strings = strings if strings is not None else []
         self.label_counter = 0
-        self.counter_variable_counter = 0
+        # number of stack items the code generator may keep in registers (0 to 2)
+        self.cache_size = 0
+        # registers currently holding the top of the stack, bottom to top
+        self.cached: List[str] = []
+        # lines of assembly emitted since the code was last taken out
+        self.asm: List[str] = []
+        # subroutines of called words: id(definition) -> (label, definition), and the
+        # ones whose body still has to be compiled
+        self.words = {}
+        self.pending = []
+        # names of the definitions compiled so far and the number of subroutines
+        self.defined = set()
+        self.word_count = 0
+        self.loop_depth = 0
+        # (kind, definition) of every counter of instrumented code, None when not instrumenting
+        self.counters = None
+        self.counter_ids = {}
+
+    def call(self, body, loop=None):
+        '''continues the simulation with body, returns to the caller once it is done'''
+        self.frames.append((self.body, self.index, self.loop))
+        self.body = body
+        self.index = 0
+        self.loop = loop
+
+    def outer_loop(self, n: int):
+        '''[counter, end] of the n-th running loop around the current one, None if there is none'''
+        loop = self.loop
+        frames = len(self.frames)
+        while n > 0 and frames > 0:
+            frames -= 1
+            loop = self.frames[frames][2]
+            if loop is not None:
+                n -= 1
+        return loop if n == 0 else None
+
+    def execute(self, body):
+        '''simulates body right away and returns when it is done'''
+        self.call(body)
+        self.run(len(self.frames))
+        self.body, self.index, self.loop = self.frames.pop()
+
+    def run(self, depth: int = 0):
+        '''simulates nodes until the body of the frame at depth is done'''
+        node = None
+        try:
+            while True:
+                body = self.body
+                while self.index < len(body):
+                    node = body[self.index]
+                    self.index += 1
+                    node.simulate(self)
+                    body = self.body
+
+                loop = self.loop
+                if loop is not None:
+                    loop[0] += 1
+                    if loop[0] < loop[1]:
+                        self.index = 0
+                        continue
+
+                if len(self.frames) == depth:
+                    return
+                self.body, self.index, self.loop = self.frames.pop()
+        except StackOverflowError as error:
+            # the stack does not know which node pushed
+            if error.file_name is None and node is not None and node.token is not None:
+                error.file_name = node.token.file_name
+                error.line_number = node.token.line_number
+            raise
 
     def get_label(self) -> str:
         label = f'.L{self.label_counter}'
         self.label_counter += 1
         return label
 
-    def get_counter_label(self) -> str:
-        label = f'Counter_{self.counter_variable_counter}'
-        self.counter_variable_counter += 1
-        return label
+    def get_word_label(self, definition) -> str:
+        '''label of the subroutine of a definition, its body is compiled by compile_pending'''
+        word = self.words.get(id(definition))
+        if word is None:
+            word = (f'Word_{self.word_count}', definition)
+            self.word_count += 1
+            self.words[id(definition)] = word
+            self.pending.append(word)
+        return word[0]
+
+    # --- code generator ---
+
+    def emit(self, line: str):
+        '''appends a line of assembly to the output of the current statement'''
+        self.asm.append(line)
+
+    def spill(self):
+        '''writes all cached items back to the stack, done before jumps, labels and calls'''
+        for reg in self.cached:
+            self.asm.append(f'    push {reg}\n')
+        self.cached = []
+
+    def take(self, n: int) -> List[str]:
+        '''removes the top n items, returns their registers (bottom to top)'''
+        while len(self.cached) < n:
+            reg = [r for r in CACHE_REGISTERS if r not in self.cached][0]
+            self.asm.append(f'    pop {reg}\n')
+            self.cached.insert(0, reg)
+        regs = self.cached[len(self.cached) - n:]
+        del self.cached[len(self.cached) - n:]
+        return regs
+
+    def free(self) -> str:
+        '''returns a register that can take a new item'''
+        if len(self.cached) == len(CACHE_REGISTERS):
+            self.asm.append(f'    push {self.cached[0]}\n')
+            del self.cached[0]
+        return [r for r in CACHE_REGISTERS if r not in self.cached][0]
+
+    def put(self, reg: str):
+        '''makes reg the new top item, spills the bottom once the cache is full'''
+        self.cached.append(reg)
+        if len(self.cached) > self.cache_size:
+            self.asm.append(f'    push {self.cached[0]}\n')
+            del self.cached[0]
@@ -0,0 +1,112 @@
+import sys
+from typing import Iterator
+from src.analysis import Analyzer
+from src.bytecode import Compiler
+from src.error import Error
+from src.lexer import Lexer, Token
+from src.nodes import Node
+from src.optimizer import optimize_definition
+from src.parser import Parser
+from src.prog import Program
+from src.stack import ArrayStack
+from src import vm
+
+try:
+    # line editing and history for input()
+    import readline  # noqa: F401
+except ImportError:
+    pass
+
+PROMPT = '> '
+# shown while a statement (usually a definition) continues on the next line
+CONTINUE = '. '
+
+
+class Repl():
+    '''evaluates statements as they are typed, definitions and the stack last for the session
+
+    the parser pulls tokens straight from the input, a line is only read once the tokens
+    before it are used up. every line is lexed and parsed once, a definition may span
+    several lines and earlier lines are never looked at again.
+    '''
+
+    def __init__(self, engine: str = 'vm', opt: int = 1, stack_size: int = 1 << 16, name: str = '<repl>') -> None:
+        self.engine = engine
+        self.opt = opt
+        self.name = name
+        self.prog = Program([], {}, ArrayStack(stack_size))
+        self.analyzer = Analyzer(self.prog.stack.capacity)
+        # keeps the compiled word bodies, only new statements are compiled
+        self.compiler = Compiler(self.prog)
+        # prompts are only shown when a person is typing
+        self.interactive = sys.stdin.isatty()
+        self.line_number = 0
+        # tokens read since the last complete statement
+        self.pulled = 0
+        self.done = False
+
+    def read(self, prompt: str) -> str:
+        if self.interactive:
+            return input(prompt)
+        line = sys.stdin.readline()
+        if line == '':
+            raise EOFError()
+        return line
+
+    def lines(self) -> Iterator[str]:
+        while True:
+            try:
+                line = self.read(PROMPT if self.pulled == 0 else CONTINUE)
+            except EOFError:
+                self.done = True
+                return
+            self.line_number += 1
+            yield line
+
+    def tokens(self) -> Iterator[Token]:
+        for token in Lexer(self.name, self.lines(), self.line_number + 1).tokens():
+            self.pulled += 1
+            yield token
+
+    def run(self):
+        '''reads and evaluates statements until the input ends'''
+        while not self.done:
+            # after an error the rest of the line is dropped and parsing starts over
+            self.pulled = 0
+            try:
+                parser = Parser(self.tokens(), self.prog.dict, self.prog.strings)
+                for node in parser.statements():
+                    self.pulled = 0
+                    self.evaluate(node)
+            except (Error, ValueError, ZeroDivisionError) as error:
+                print(error, file=sys.stderr)
+            except KeyboardInterrupt:
+                print(file=sys.stderr)
+        if self.interactive:
+            print()
+
+    def evaluate(self, node: Node):
+        '''runs a single top level statement on the stack of the session'''
+        prog = self.prog
+        if self.opt >= 1:
+            optimize_definition(node)
+        if self.engine == 'tree':
+            # a failed statement may have left frames behind
+            prog.frames = []
+            prog.loop = None
+            prog.checked = not self.analyzer.verify(node, len(prog.stack))
+            prog.body = [node]
+            prog.index = 0
+            prog.run()
+            return
+        self.analyzer.verify(node, len(prog.stack))
+        start = self.compiler.compile_statement(node)
+        try:
+            vm.run(self.compiler.code, prog, start)
+        finally:
+            self.compiler.release(start)
+
+
+def repl(args) -> int:
+    Repl(args.engine, args.opt, args.stack_size).run()
+    return 0
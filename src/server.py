@@ -0,0 +1,87 @@
+import io
+import json
+import os
+import socket
+import socketserver
+import sys
+import traceback
+from contextlib import redirect_stderr, redirect_stdout
+from typing import Callable, Optional
+from src.error import Error
+
+# shared with client.py, which must not import anything from src
+SOCKET = os.environ.get('STACKY_SOCKET') or f'/tmp/stacky-{os.getuid()}.sock'
+
+
+class Handler(socketserver.StreamRequestHandler):
+    '''runs one program per connection
+
+    the client sends a json object with either "path" or "source" (and "name") plus
+    optional "options", then closes its side. the answer is a json object with
+    "stdout", "stderr" and "status".
+    '''
+
+    def handle(self):
+        data = self.rfile.read()
+        if not data:
+            # a connection without a request checks whether the server is running
+            return
+        stdout = io.StringIO()
+        stderr = io.StringIO()
+        status = 0
+        try:
+            request = json.loads(data.decode('utf-8'))
+            with redirect_stdout(stdout), redirect_stderr(stderr):
+                if 'source' in request:
+                    name = request.get('name', '<source>')
+                    self.server.run(name, io.StringIO(request['source']), request.get('options', {}))
+                else:
+                    with open(request['path'], 'r') as f:
+                        self.server.run(request['path'], f, request.get('options', {}))
+        except Error as error:
+            stderr.write(f'{error}\n')
+            status = 1
+        except Exception:
+            stderr.write(traceback.format_exc())
+            status = 1
+        answer = {'stdout': stdout.getvalue(), 'stderr': stderr.getvalue(), 'status': status}
+        self.wfile.write(json.dumps(answer).encode('utf-8'))
+
+
+class Server(socketserver.ForkingMixIn, socketserver.UnixStreamServer):
+    '''every program runs in a forked child of the warm server, so programs neither
+    share state nor block each other'''
+
+    def __init__(self, path: str, run: Callable) -> None:
+        self.run = run
+        super().__init__(path, Handler)
+
+
+def in_use(path: str) -> bool:
+    '''whether a server accepts connections on the socket at path'''
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        try:
+            s.connect(path)
+        except OSError:
+            return False
+    return True
+
+
+def serve(run: Callable, path: Optional[str] = None) -> int:
+    '''accepts programs on the unix socket at path until interrupted, run(name, lines, options)
+    simulates them. returns the exit status'''
+    path = path or SOCKET
+    if os.path.exists(path):
+        # only the socket of a server that is gone is replaced
+        if in_use(path):
+            print(f'a server is already running on {path}', file=sys.stderr)
+            return 1
+        os.unlink(path)
+    with Server(path, run) as server:
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.unlink(path)
+    return 0
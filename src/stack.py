@@ -1,7 +1,20 @@
+from array import array
 from typing import List
+from src.error import StackOverflowError
+
+INT64_MIN = -0x8000000000000000
+INT64_MAX = 0x7FFFFFFFFFFFFFFF
+
+
+def wrap(value: int) -> int:
+    '''wraps value around like a 64 bit register'''
+    return ((value - INT64_MIN) & 0xFFFFFFFFFFFFFFFF) + INT64_MIN
 
 
 class Stack():
+    # unbounded, kept for compatibility with ArrayStack
+    capacity = INT64_MAX
+
     def __init__(self) -> None:
         self.stack: List[int] = []
 
@@ -11,6 +24,26 @@ class Stack():
     def push(self, value: int) -> None:
         self.stack.append(value)
 
+    def pop_n(self, n: int) -> List[int]:
+        '''removes the top n values, returned from bottom to top'''
+        if len(self.stack) < n:
+            raise IndexError('pop from empty stack')
+        values = self.stack[len(self.stack) - n:]
+        del self.stack[len(self.stack) - n:]
+        return values
+
+    def peek(self, n: int = 1) -> List[int]:
+        '''returns the top n values from bottom to top without removing them'''
+        if len(self.stack) < n:
+            raise IndexError('peek into empty stack')
+        return self.stack[len(self.stack) - n:]
+
+    def tolist(self) -> List[int]:
+        return list(self.stack)
+
+    def load(self, values: List[int]) -> None:
+        self.stack[:] = values
+
     def __str__(self) -> str:
         s = f'------------\n'
         for el in self.stack:
@@ -23,3 +56,69 @@ class Stack():
 
     def __len__(self):
         return len(self.stack)
+
+
+class ArrayStack():
+    '''fixed capacity stack of 64 bit integers with an explicit stack pointer'''
+
+    def __init__(self, capacity: int = 1 << 16) -> None:
+        self.capacity = capacity
+        self.data = array('q', bytes(8 * capacity))
+        self.sp = 0
+
+    def pop(self) -> int:
+        sp = self.sp - 1
+        if sp < 0:
+            raise IndexError('pop from empty stack')
+        self.sp = sp
+        return self.data[sp]
+
+    def push(self, value: int) -> None:
+        sp = self.sp
+        if sp == self.capacity:
+            raise StackOverflowError(None, None, self.capacity)
+        try:
+            self.data[sp] = value
+        except OverflowError:
+            self.data[sp] = wrap(value)
+        self.sp = sp + 1
+
+    def pop_n(self, n: int) -> List[int]:
+        '''removes the top n values, returned from bottom to top'''
+        sp = self.sp - n
+        if sp < 0:
+            raise IndexError('pop from empty stack')
+        self.sp = sp
+        return self.data[sp:sp + n].tolist()
+
+    def peek(self, n: int = 1) -> List[int]:
+        '''returns the top n values from bottom to top without removing them'''
+        if self.sp < n:
+            raise IndexError('peek into empty stack')
+        return self.data[self.sp - n:self.sp].tolist()
+
+    def tolist(self) -> List[int]:
+        return self.data[:self.sp].tolist()
+
+    def load(self, values: List[int]) -> None:
+        n = len(values)
+        if n > self.capacity:
+            raise StackOverflowError(None, None, self.capacity)
+        try:
+            self.data[:n] = array('q', values)
+        except OverflowError:
+            self.data[:n] = array('q', [wrap(value) for value in values])
+        self.sp = n
+
+    def __str__(self) -> str:
+        s = f'------------\n'
+        for el in self.data[:self.sp]:
+            s += f'{str(el)}\n'
+        s += f'------------\n'
+        return s
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+    def __len__(self):
+        return self.sp
@@ -0,0 +1,180 @@
+import marshal
+import os
+from typing import Dict, List, Optional, Tuple
+from src import lexer, nodes, optimizer, parser
+from src.lexer import LOCATIONS, Token, TokenType
+from src.nodes import Node
+
+# precompiled programs (.stkc files): the parsed and, at -O1, optimized statements of a
+# source file. like .pyc files they are used as long as neither the source nor the front
+# end changed, sim then skips lexing and parsing.
+#
+# a file is MAGIC, the length of the header as 4 bytes, the marshalled header (see save) and
+# the marshalled body: the statements, the dictionary and the string pool.
+# a node is the tuple (class, token type, token value, token location, *fields) where
+# token type is -1 for nodes without token and lists of nodes are lists of such tuples.
+
+MAGIC = b'STKC'
+VERSION = 2
+
+# what a source parses to depends on these modules
+FRONTEND = [lexer, parser, nodes, optimizer]
+
+CLASSES = [c for c in vars(nodes).values() if isinstance(c, type) and issubclass(c, Node)]
+CLASS_IDS = {c: i for i, c in enumerate(CLASSES)}
+TYPES = list(TokenType)
+TYPE_IDS = {t: i for i, t in enumerate(TYPES)}
+
+
+def slots(cls) -> List[str]:
+    '''attributes of a node class besides its token, base classes first'''
+    names = []
+    for klass in reversed(cls.__mro__):
+        names += [s for s in klass.__dict__.get('__slots__', ()) if s != 'token' and s not in names]
+    return names
+
+
+FIELDS = [slots(c) for c in CLASSES]
+
+
+def stkc_path(path: str, directory: Optional[str] = None) -> str:
+    '''the precompiled form lives next to the source or, with a directory, in there'''
+    base = os.path.splitext(path)[0]
+    if directory is None:
+        return base + '.stkc'
+    return os.path.join(directory, os.path.abspath(base).replace(os.sep, '%') + '.stkc')
+
+
+def stat(path: str) -> Tuple[int, int]:
+    st = os.stat(path)
+    return st.st_mtime_ns, st.st_size
+
+
+def frontend_stamp() -> List:
+    return [(os.path.basename(m.__file__), *stat(m.__file__)) for m in FRONTEND]
+
+
+def source_hash(path: str) -> str:
+    import hashlib
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+# --- nodes ---
+
+def encode(node: Node) -> tuple:
+    token = node.token
+    cid = CLASS_IDS[type(node)]
+    if token is None:
+        head = (cid, -1, None, 0)
+    else:
+        head = (cid, TYPE_IDS[token.tokenType], token.value, token.location)
+    fields = []
+    for name in FIELDS[cid]:
+        value = getattr(node, name)
+        fields.append([encode(el) for el in value] if isinstance(value, list) else value)
+    return head + tuple(fields)
+
+
+def decode(items: list, files: Optional[List[int]]) -> List[Node]:
+    '''rebuilds the nodes, files maps the file indices of the locations if they changed'''
+    classes = CLASSES
+    fields = FIELDS
+    types = TYPES
+    new = object.__new__
+    out = []
+    append = out.append
+    for item in items:
+        cid = item[0]
+        node = new(classes[cid])
+        if item[1] < 0:
+            node.token = None
+        else:
+            location = item[3]
+            if files is not None:
+                location = (location & ~0xffff) | files[location & 0xffff]
+            node.token = Token(types[item[1]], item[2], location)
+        if len(item) > 4:
+            for name, value in zip(fields[cid], item[4:]):
+                setattr(node, name, decode(value, files) if value.__class__ is list else value)
+        append(node)
+    return out
+
+
+class Recorder():
+    '''encodes the statements that pass through it, before they run and change'''
+
+    def __init__(self) -> None:
+        self.statements: List[tuple] = []
+        # id of a statement -> its index
+        self.index: Dict[int, int] = {}
+
+    def record(self, statements):
+        for node in statements:
+            self.index[id(node)] = len(self.statements)
+            self.statements.append(encode(node))
+            yield node
+
+    def words(self, dict: Dict) -> List:
+        '''the parser dictionary, definitions refer to their statement'''
+        words = []
+        for name, value in dict.items():
+            if id(value) in self.index:
+                words.append((name, self.index[id(value)], None))
+            elif isinstance(value, (str, int)):
+                words.append((name, -1, value))
+        return words
+
+
+# --- files ---
+
+def load(path: str, target: str, opt: int) -> Optional[Tuple[List[Node], Dict, List[str]]]:
+    '''statements, dictionary and string pool of path from target, None if it is missing or out of date'''
+    try:
+        with open(target, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                return None
+            length = int.from_bytes(f.read(4), 'little')
+            version, level, frontend, mtime, size, digest, files = marshal.loads(f.read(length))
+            if version != VERSION or level != opt or frontend != frontend_stamp():
+                return None
+            if (mtime, size) != stat(path):
+                # touched or checked out again, the content decides
+                if size != stat(path)[1] or digest != source_hash(path):
+                    return None
+            # marshal.load reads files in small pieces and is many times slower
+            statements, words, strings = marshal.loads(f.read())
+    except (OSError, EOFError, ValueError, TypeError):
+        # missing, unreadable or damaged files are written again
+        return None
+
+    remap = [LOCATIONS.file_index(name) for name in files]
+    statements = decode(statements, None if remap == list(range(len(files))) else remap)
+    dict = {}
+    for name, index, value in words:
+        dict[name] = statements[index] if index >= 0 else value
+    return statements, dict, strings
+
+
+def save(path: str, target: str, opt: int, before: Tuple[int, int], recorder: Recorder, dict: Dict, strings: List[str]):
+    '''writes target unless path changed since it was stat-ed (before) and read'''
+    try:
+        if stat(path) != before:
+            return
+        header = (VERSION, opt, frontend_stamp(), before[0], before[1], source_hash(path), LOCATIONS.files)
+        body = (recorder.statements, recorder.words(dict), strings)
+        directory = os.path.dirname(target)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp = f'{target}.{os.getpid()}.tmp'
+        header = marshal.dumps(header)
+        with open(tmp, 'wb') as f:
+            f.write(MAGIC)
+            f.write(len(header).to_bytes(4, 'little'))
+            f.write(header)
+            marshal.dump(body, f)
+        # readers see the old file or the new one, never a part of it
+        os.replace(tmp, target)
+    except (OSError, ValueError):
+        # a read-only directory or an unmarshallable value, the next run parses again
+        pass
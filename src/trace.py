@@ -0,0 +1,128 @@
+import sys
+import time
+from typing import Iterable, Optional
+
+# trace levels, OFF leaves the pipeline untouched
+OFF = 0
+PHASES = 1      # one summary event per phase
+ITEMS = 2       # additionally every token, node and statement
+
+LEVELS = {'off': OFF, 'phases': PHASES, 'items': ITEMS}
+
+
+def describe_token(token) -> dict:
+    return {'line': token.line_number, 'type': token.tokenType.name, 'value': token.value}
+
+
+def describe_node(node) -> dict:
+    fields = {'line': node.token.line_number if node.token is not None else None,
+              'node': type(node).__name__}
+    name = getattr(node, 'name', None)
+    if name is not None:
+        fields['name'] = name
+    elif node.token is not None and node.token.value is not None:
+        fields['value'] = node.token.value
+    return fields
+
+
+def is_eof(token) -> bool:
+    return token.tokenType.name == 'EOF'
+
+
+class Tracer():
+    '''writes events of the lexer, parser, optimizer and runtime / codegen phases to a sink
+
+    out is '-' for stderr or a file name, format is 'text' (one "phase event key=value"
+    line per event) or 'json' (one compact json object per line). the phases run
+    interleaved, the seconds of a phase are the time spent in it alone.
+    '''
+
+    def __init__(self, level: int = OFF, out: str = '-', format: str = 'text', file_name: Optional[str] = None) -> None:
+        self.level = level
+        self.format = format
+        self.file_name = file_name
+        self.sink = None
+        if level != OFF:
+            self.sink = sys.stderr if out == '-' else open(out, 'w')
+            if format == 'json':
+                # keeps json out of the startup of untraced runs
+                import json
+                self.dumps = json.dumps
+        # time spent in the phases traced so far
+        self.spent = 0.0
+
+    def event(self, phase: str, event: str, **fields):
+        if self.file_name is not None:
+            fields = {'file': self.file_name, **fields}
+        if self.format == 'json':
+            record = {'phase': phase, 'event': event, **fields}
+            self.sink.write(self.dumps(record, separators=(',', ':')) + '\n')
+        else:
+            values = ' '.join(f'{k}={v}' for k, v in fields.items())
+            self.sink.write(f'{phase:9} {event:9} {values}\n')
+
+    def tokens(self, tokens: Iterable) -> Iterable:
+        # nothing pulls past EOF, the lexer is done once it is seen
+        return self.stream('lexer', tokens, describe_token, 'token', is_eof)
+
+    def nodes(self, phase: str, nodes: Iterable) -> Iterable:
+        return self.stream(phase, nodes, describe_node, 'node')
+
+    def stream(self, phase: str, items: Iterable, describe, event: str, last=None) -> Iterable:
+        '''passes the output of a phase through and traces it, returns items itself when tracing is off'''
+        if self.level == OFF:
+            return items
+        return self.produced(phase, iter(items), describe, event, last)
+
+    def produced(self, phase: str, items, describe, event: str, last):
+        count = 0
+        waited = 0.0
+        while True:
+            # waiting for an item runs this phase and the phases before it
+            start = time.perf_counter()
+            item = next(items, None)
+            waited += time.perf_counter() - start
+            if item is None:
+                break
+            count += 1
+            if self.level >= ITEMS:
+                self.event(phase, event, **describe(item))
+            if last is not None and last(item):
+                self.done(phase, count, waited - self.spent)
+                yield item
+                return
+            yield item
+        self.done(phase, count, waited - self.spent)
+
+    def statements(self, phase: str, statements: Iterable, prog=None) -> Iterable:
+        '''traces the top level statements as the last phase runs or compiles them, the stack
+        depth of prog is recorded after each one'''
+        if self.level == OFF:
+            return statements
+        return self.consumed(phase, statements, prog)
+
+    def consumed(self, phase: str, statements: Iterable, prog):
+        count = 0
+        busy = 0.0
+        for node in statements:
+            # the consumer asks for the next statement once this one is done
+            start = time.perf_counter()
+            yield node
+            busy += time.perf_counter() - start
+            count += 1
+            if self.level >= ITEMS:
+                fields = describe_node(node)
+                if prog is not None:
+                    fields['depth'] = len(prog.stack)
+                self.event(phase, 'statement', **fields)
+        fields = {'depth': len(prog.stack)} if prog is not None else {}
+        self.event(phase, 'done', count=count, seconds=round(busy, 6), **fields)
+
+    def done(self, phase: str, count: int, seconds: float):
+        self.spent += seconds
+        self.event(phase, 'done', count=count, seconds=round(seconds, 6))
+
+    def close(self):
+        if self.sink is not None and self.sink is not sys.stderr:
+            self.sink.close()
+        self.sink = None
@@ -0,0 +1,184 @@
+from src.bytecode import *
+from src.error import InvalidSyntaxError, NotDefinedError, NotEnoughOperantsError, StackOverflowError
+from src.prog import Program
+from src.stack import INT64_MAX, INT64_MIN, wrap
+
+
+def run(code: Code, prog: Program, pc: int = 0):
+    '''executes compiled bytecode on the stack of prog from pc until HALT'''
+    ops = code.ops
+    consts = code.consts
+    # a plain list is the fastest stack in cpython, it is copied back into prog.stack at the end.
+    # results are wrapped to 64 bit and the capacity is checked on every backward jump and call,
+    # only those can grow the stack without bound
+    stack = prog.stack.tolist()
+    capacity = prog.stack.capacity
+    low = INT64_MIN
+    high = INT64_MAX
+    push = stack.append
+    pop = stack.pop
+    strings = prog.strings
+    returns = []    # return addresses
+    loops = []      # [counter, end] of the running loops
+
+    try:
+        while True:
+            op = ops[pc]
+            if op == OP_PUSH:
+                push(ops[pc + 1])
+                pc += 2
+            elif op == OP_I:
+                push(loops[-1][0])
+                pc += 1
+            elif op == OP_LOOP:
+                loop = loops[-1]
+                loop[0] += 1
+                if loop[0] < loop[1]:
+                    if len(stack) > capacity:
+                        break
+                    pc = ops[pc + 1]
+                else:
+                    loops.pop()
+                    pc += 2
+            elif op == OP_ADD:
+                a = pop()
+                x = stack[-1] + a
+                stack[-1] = x if low <= x <= high else wrap(x)
+                pc += 1
+            elif op == OP_SUB:
+                a = pop()
+                x = stack[-1] - a
+                stack[-1] = x if low <= x <= high else wrap(x)
+                pc += 1
+            elif op == OP_MUL:
+                a = pop()
+                x = stack[-1] * a
+                stack[-1] = x if low <= x <= high else wrap(x)
+                pc += 1
+            elif op == OP_MOD:
+                a = pop()
+                stack[-1] %= a
+                pc += 1
+            elif op == OP_CALL:
+                if len(stack) > capacity:
+                    break
+                returns.append(pc + 2)
+                pc = ops[pc + 1]
+            elif op == OP_RET:
+                pc = returns.pop()
+            elif op == OP_DUP:
+                push(stack[-1])
+                pc += 1
+            elif op == OP_SWAP:
+                stack[-1], stack[-2] = stack[-2], stack[-1]
+                pc += 1
+            elif op == OP_DROP:
+                pop()
+                pc += 1
+            elif op == OP_EQ:
+                a = pop()
+                stack[-1] = int(stack[-1] == a)
+                pc += 1
+            elif op == OP_LT:
+                a = pop()
+                stack[-1] = int(stack[-1] < a)
+                pc += 1
+            elif op == OP_GT:
+                a = pop()
+                stack[-1] = int(stack[-1] > a)
+                pc += 1
+            elif op == OP_BRANCH:
+                a = pop()
+                if a == 1:
+                    pc += 2
+                elif a == 0:
+                    pc = ops[pc + 1]
+                else:
+                    token = code.tokens[pc]
+                    raise InvalidSyntaxError(token.file_name, token.line_number, token)
+            elif op == OP_JMP:
+                pc = ops[pc + 1]
+            elif op == OP_DO:
+                a = pop()   # begin
+                b = pop()   # end
+                if a < b:
+                    loops.append([a, b])
+                    pc += 2
+                else:
+                    pc = ops[pc + 1]
+            elif op == OP_PRINT:
+                print(pop())
+                pc += 1
+            elif op == OP_STRING:
+                push(ops[pc + 1])   # pointer
+                push(ops[pc + 2])   # length
+                pc += 3
+            elif op == OP_PUTS:
+                pop()   # length
+                print(strings[pop()])
+                pc += 1
+            elif op == OP_AND:
+                a = pop()
+                stack[-1] = int(a and stack[-1])
+                pc += 1
+            elif op == OP_OR:
+                a = pop()
+                stack[-1] = int(a or stack[-1])
+                pc += 1
+            elif op == OP_INVERT:
+                stack[-1] = int(not stack[-1])
+                pc += 1
+            elif op == OP_DIV:
+                a = pop()
+                stack[-1] = int(stack[-1] / a)
+                pc += 1
+            elif op == OP_EMIT:
+                print(chr(int(pop())))
+                pc += 1
+            elif op == OP_DEBUG_STACK:
+                prog.stack.load(stack)
+                print(prog.stack)
+                pc += 1
+            elif op == OP_DEBUG_DICT:
+                for k, v in prog.dict.items():
+                    print(f'{k} -> {v}\n')
+                pc += 1
+            elif op == OP_J or op == OP_K:
+                depth = 2 if op == OP_J else 3
+                if len(loops) < depth:
+                    token = code.tokens[pc]
+                    raise NotDefinedError(token.file_name, token.line_number, token.value)
+                push(loops[-depth][0])
+                pc += 1
+            elif op == OP_FAIL:
+                raise consts[ops[pc + 1]]
+            elif op == OP_HALT:
+                if len(stack) > capacity:
+                    break
+                prog.stack.load(stack)
+                return
+            else:
+                raise InvalidSyntaxError(None, None, op)
+    except IndexError:
+        # the stack ran dry, report it for the instruction that needed the operands
+        token = code.tokens[pc]
+        raise NotEnoughOperantsError(token.file_name, token.line_number, ARITY[ops[pc]]) from None
+
+    # left the loop because the stack grew past its capacity
+    token = code.tokens[pc]
+    file_name = token.file_name if token is not None else None
+    line_number = token.line_number if token is not None else None
+    raise StackOverflowError(file_name, line_number, capacity)
+
+
+def simulate_statements(prog: Program, statements, analyzer=None):
+    '''compiles and runs top level nodes one by one as they arrive'''
+    compiler = Compiler(prog)
+    for node in statements:
+        # underflows the analyzer can prove are reported before the statement runs,
+        # the vm itself detects the rest for free through the IndexError of its list
+        if analyzer is not None:
+            analyzer.verify(node, len(prog.stack))
+        start = compiler.compile_statement(node)
+        run(compiler.code, prog, start)
+        compiler.release(start)
@@ -1,4 +1,7 @@
 from subprocess import Popen, PIPE
+import os
+import shutil
+import tempfile
 
 sim = f'python3 main.py sim'
 com = f'python3 main.py com'
@@ -24,8 +27,203 @@ def test_word_com():
     print(f'Test: Compile Word      ' + ('✔️' if out == expected else '❌'))
 
 
+def test_loop_sim():
+    path = f'test/loop.f'
+    cmd = f'{sim} {path}'
+    p = Popen(cmd.split(), stdin=PIPE, stdout=PIPE, stderr=PIPE)
+    out, err = p.communicate()
+    out = str(out.decode("utf-8"))
+    expected = f'0\n1\n1\n0\n4\n1\n9\n0\n'
+    print(f'Test: Simulate Loop     ' + ('✔️' if out == expected else '❌'))
+
+
+def test_nested_loop_sim():
+    path = f'test/nested.f'
+    cmd = f'{sim} {path}'
+    p = Popen(cmd.split(), stdin=PIPE, stdout=PIPE, stderr=PIPE)
+    out, err = p.communicate()
+    out = str(out.decode("utf-8"))
+    expected = f'1\n2\n2\n3\n2\n3\n3\n4\n'
+    print(f'Test: Simulate Nested   ' + ('✔️' if out == expected else '❌'))
+
+
+def test_redefine_sim():
+    # both engines look words up when they are called, a redefinition reaches earlier words
+    path = f'test/redefine.f'
+    outs = []
+    for engine in ('vm', 'tree'):
+        cmd = f'{sim} --no-stkc --engine {engine} {path}'
+        p = Popen(cmd.split(), stdin=PIPE, stdout=PIPE, stderr=PIPE)
+        out, err = p.communicate()
+        outs.append(str(out.decode("utf-8")))
+    expected = f'1\n2\n'
+    print(f'Test: Simulate Redefine ' + ('✔️' if outs == [expected, expected] else '❌'))
+
+
+def test_underflow_sim():
+    # -O1 keeps the nodes that fail on a too small stack, the errors are the ones of -O0
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, 'underflow.f')
+    errors = []
+    for source in ('dup drop', '0 +', 'swap swap'):
+        with open(path, 'w') as f:
+            f.write(source + '\n')
+        for opt in (0, 1):
+            cmd = f'{sim} --no-stkc -O{opt} {path}'
+            p = Popen(cmd.split(), stdin=PIPE, stdout=PIPE, stderr=PIPE)
+            out, err = p.communicate()
+            errors.append(str(err.decode("utf-8")).strip().splitlines()[-1:])
+    shutil.rmtree(directory)
+    ok = all(e and 'Not Enough Operants' in e[0] for e in errors) and errors[0::2] == errors[1::2]
+    print(f'Test: Simulate Operants ' + ('✔️' if ok else '❌'))
+
+
+def test_strings_sim():
+    # the same literal in a word, a loop and at the top level is one pool entry
+    path = f'test/strings.f'
+    cmd = f'{sim} --no-stkc {path}'
+    p = Popen(cmd.split(), stdin=PIPE, stdout=PIPE, stderr=PIPE)
+    out, err = p.communicate()
+    out = str(out.decode("utf-8"))
+    expected = f'hello\na b\nhello\na b\nhello\na b\nhello\n\n\n\n'
+    print(f'Test: Simulate Strings  ' + ('✔️' if out == expected else '❌'))
+
+
+def test_profile_sim():
+    # the program prints as usual, the report goes to stderr
+    path = f'test/loop.f'
+    cmd = f'{sim} --profile {path}'
+    p = Popen(cmd.split(), stdin=PIPE, stdout=PIPE, stderr=PIPE)
+    out, err = p.communicate()
+    out = str(out.decode("utf-8"))
+    err = str(err.decode("utf-8"))
+    expected = f'0\n1\n1\n0\n4\n1\n9\n0\n'
+    # name and calls of the words
+    calls = sorted(line.split()[:2] for line in err.splitlines() if line.startswith(('squares ', 'even? ')))
+    print(f'Test: Simulate Profile  ' + ('✔️' if out == expected and calls == [['even?', '4'], ['squares', '1']] else '❌'))
+
+
+def test_profile_forward_sim():
+    # profiling parses statements as they run, a call before the definition still fails
+    path = f'test/forward.f'
+    errors = []
+    for options in ('', '--profile'):
+        cmd = f'{sim} --no-stkc {options} {path}'
+        p = Popen(cmd.split(), stdin=PIPE, stdout=PIPE, stderr=PIPE)
+        out, err = p.communicate()
+        errors.append((str(out.decode("utf-8")), str(err.decode("utf-8")).strip().splitlines()[-1:]))
+    ok = errors[0] == errors[1] and 'Word is not defined - bar' in errors[0][1][0]
+    print(f'Test: Simulate Forward  ' + ('✔️' if ok else '❌'))
+
+
+def test_stkc_sim():
+    # the second run loads the precompiled program the first one wrote
+    path = f'test/loop.f'
+    cmd = f'{sim} --stkc-dir {tempfile.mkdtemp()} {path}'
+    outs = []
+    for _ in range(2):
+        p = Popen(cmd.split(), stdin=PIPE, stdout=PIPE, stderr=PIPE)
+        out, err = p.communicate()
+        outs.append(str(out.decode("utf-8")))
+    expected = f'0\n1\n1\n0\n4\n1\n9\n0\n'
+    print(f'Test: Simulate Stkc     ' + ('✔️' if outs == [expected, expected] else '❌'))
+
+
+def test_repl():
+    cmd = f'python3 main.py repl'
+    p = Popen(cmd.split(), stdin=PIPE, stdout=PIPE, stderr=PIPE)
+    source = ': square\ndup * ;\n3 square .\n5\nsquare .\nfoo\n2 square .\n'
+    out, err = p.communicate(source.encode('utf-8'))
+    out = str(out.decode("utf-8"))
+    expected = f'9\n25\n4\n'
+    print(f'Test: Repl              ' + ('✔️' if out == expected and b'foo' in err else '❌'))
+
+
+def compile_and_run(path: str, options: str):
+    '''compiles path in a temporary directory with the builtin assembler, returns stdout and stderr of the binary'''
+    directory = tempfile.mkdtemp()
+    path = shutil.copy(path, directory)
+    binary = os.path.splitext(path)[0]
+    cmd = f'{com} --no-cache --backend builtin {options} {path}'
+    Popen(cmd.split(), stdin=PIPE, stdout=PIPE, stderr=PIPE).communicate()
+    out, err = b'', b''
+    if os.path.exists(binary):
+        p = Popen([binary], stdin=PIPE, stdout=PIPE, stderr=PIPE)
+        out, err = p.communicate()
+    shutil.rmtree(directory)
+    return str(out.decode("utf-8")), str(err.decode("utf-8"))
+
+
+def test_build_all_com():
+    # a file that fails to lex is reported with the others, the remaining files are still built
+    directory = tempfile.mkdtemp()
+    paths = [shutil.copy(path, directory) for path in (f'test/loop.f', f'test/unclosed.f')]
+    cmd = f'{com} --no-cache --backend builtin -j 2 {" ".join(paths)}'
+    p = Popen(cmd.split(), stdin=PIPE, stdout=PIPE, stderr=PIPE)
+    out, err = p.communicate()
+    err = str(err.decode("utf-8"))
+    built = os.path.exists(os.path.splitext(paths[0])[0])
+    shutil.rmtree(directory)
+    expected = f'{paths[1]}: No Closing Quotation: {paths[1]}:1\n1 of 2 files failed\n'
+    print(f'Test: Compile Files     ' + ('✔️' if p.returncode == 1 and err == expected and built else '❌'))
+
+
+def test_instrument_com():
+    # the binary prints as usual and writes its counters to stderr at exit
+    out, err = compile_and_run(f'test/loop.f', f'--instrument')
+    expected = f'0\n1\n1\n0\n4\n1\n9\n0\n'
+    counters = f'word squares 1\nloop squares 4\nword square 4\nword even? 4\nthen even? 2\nelse even? 2\n'
+    print(f'Test: Instrument        ' + ('✔️' if out == expected and err == counters else '❌'))
+
+
+def test_rebind_com():
+    # inlined (-O1) and called (-O0) words see a redefinition alike, as in sim
+    path = f'test/rebind.f'
+    outs = [compile_and_run(path, f'-O{opt}')[0] for opt in (0, 1)]
+    expected = f'1\n2\n2\n3\n'
+    print(f'Test: Compile Rebind    ' + ('✔️' if outs == [expected, expected] else '❌'))
+
+
+def test_fold_com():
+    # constant folding (-O1) gives the same results as the unfolded code (-O0)
+    path = f'test/fold.f'
+    outs = [compile_and_run(path, f'-O{opt}')[0] for opt in (0, 1)]
+    print(f'Test: Compile Fold      ' + ('✔️' if outs[0] and outs[0] == outs[1] else '❌'))
+
+
+def test_return_stack_com():
+    # recursion deeper than the return stack ends with an error instead of overwriting memory
+    path = f'test/deep.f'
+    results = [compile_and_run(path, f'-O{opt}') for opt in (0, 1)]
+    expected = ('', f'Return Stack Overflow (Capacity 65536)\n')
+    print(f'Test: Compile Recursion ' + ('✔️' if results == [expected, expected] else '❌'))
+
+
+def test_loop_stack_com():
+    # the same for recursion through a loop, also when the counters follow the loop stack
+    path = f'test/deep_loop.f'
+    results = [compile_and_run(path, f'-O{opt} {instrument}') for opt in (0, 1) for instrument in ('', '--instrument')]
+    expected = ('', f'Loop Stack Overflow (Capacity 4096)\n')
+    print(f'Test: Compile Loop Rec  ' + ('✔️' if results == [expected] * 4 else '❌'))
+
+
 def main():
     test_word_sim()
+    test_loop_sim()
+    test_nested_loop_sim()
+    test_redefine_sim()
+    test_underflow_sim()
+    test_strings_sim()
+    test_profile_sim()
+    test_profile_forward_sim()
+    test_stkc_sim()
+    test_repl()
+    test_build_all_com()
+    test_instrument_com()
+    test_rebind_com()
+    test_fold_com()
+    test_return_stack_com()
+    test_loop_stack_com()
     test_word_com()
 
 
@@ -0,0 +1,2 @@
+: down? dup 0 > if 1 - down? then ;
+100000 down? .
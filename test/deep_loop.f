@@ -0,0 +1,3 @@
+: lp 1 0 do go? loop ;
+: go? dup 0 > if 1 - lp then ;
+5000 go? .
@@ -0,0 +1,5 @@
+2 3 and .
+0 7 - 3 mod .
+1 0 or .
+2 0 or .
+7 2 mod .
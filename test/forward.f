@@ -0,0 +1,2 @@
+bar
+: bar 1 . ;
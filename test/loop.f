@@ -0,0 +1,4 @@
+: square dup * ;
+: even? 2 mod 0 = if 1 . else 0 . then ;
+: squares 4 0 do i square . i even? loop ;
+squares
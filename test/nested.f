@@ -0,0 +1,4 @@
+: inner 2 0 do i j k + + . loop ;
+: middle 2 0 do inner loop ;
+: outer 3 1 do middle loop ;
+outer
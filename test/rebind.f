@@ -0,0 +1,9 @@
+: foo 1 ;
+: bar foo 0 + 0 + 0 + 0 + 0 + 0 + 0 + 0 + ;
+bar .
+: foo 2 ;
+bar .
+: baz foo ;
+baz .
+: foo 3 ;
+baz .
@@ -0,0 +1,5 @@
+: foo 1 ;
+: bar foo ;
+bar .
+: foo 2 ;
+bar .
@@ -0,0 +1,5 @@
+: hi "hello" puts ;
+: main 3 0 do hi "a b" puts loop ;
+main
+"hello" puts
+"" puts cr puts
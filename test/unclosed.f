@@ -0,0 +1 @@
+"abc .